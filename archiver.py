@@ -0,0 +1,221 @@
+"""Copy committed orders from Redis into a SQL database for accounting.
+
+With ARCHIVE_STREAM set, checkout only appends each order (and later each
+status change) to that stream; this worker drains it in batches and upserts
+the rows, so the order history outlives the 7-day Redis TTL without checkout
+ever waiting on SQL. Writes are idempotent on order id, so a batch that is
+retried after a crash is harmless. Set the same ARCHIVE_STREAM for the app
+and the archiver; without it the app archives nothing.
+
+    pip install -r requirements-archiver.txt
+    ARCHIVE_STREAM=order_archive ARCHIVE_DATABASE_URL=postgresql://... python archiver.py
+    python archiver.py --once            # drain what is queued, then exit
+    python archiver.py --backfill        # also archive orders already in Redis
+
+ARCHIVE_DATABASE_URL defaults to a local SQLite file.
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timezone
+from db import redis_client
+from logs import setup_logging
+from message_queue import ack_messages, ensure_group, read_messages
+from order_store import ARCHIVE_STREAM_KEY, ORDERS_BY_TIME_KEY, order_key
+
+DATABASE_URL = os.environ.get("ARCHIVE_DATABASE_URL", "sqlite:///orders_archive.db")
+GROUP = "order_archivers"
+
+running = threading.Event()
+
+
+def stream_version(entry_id):
+    """Orderable number for a stream entry id ("<ms>-<seq>")."""
+    ms, seq = entry_id.split("-")
+    return int(ms) * 10000 + min(int(seq), 9999)
+
+
+def define_tables(metadata):
+    from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer, Numeric, String, Table, Text
+
+    orders = Table(
+        "orders", metadata,
+        Column("order_id", String(32), primary_key=True),
+        Column("sender", String(32), index=True),
+        Column("status", String(16), nullable=False, index=True),
+        Column("total_amount", Numeric(12, 2), nullable=False),
+        Column("payment_method", Text),
+        Column("created_at", DateTime(timezone=True), index=True),
+        Column("updated_at", DateTime(timezone=True), nullable=False),
+        Column("data", Text, nullable=False),
+        Column("version", BigInteger, nullable=False),
+    )
+    order_items = Table(
+        "order_items", metadata,
+        Column("order_id", String(32), ForeignKey("orders.order_id"), primary_key=True),
+        Column("line", Integer, primary_key=True),
+        Column("name", Text, nullable=False),
+        Column("price", Numeric(12, 2), nullable=False),
+        Column("quantity", Integer, nullable=False),
+    )
+    return orders, order_items
+
+
+class Archive:
+    """Upserts orders into the SQL tables, a batch per transaction."""
+
+    def __init__(self, url=DATABASE_URL):
+        from sqlalchemy import MetaData, create_engine
+
+        self.engine = create_engine(url)
+        metadata = MetaData()
+        self.orders, self.order_items = define_tables(metadata)
+        metadata.create_all(self.engine)
+
+    def order_row(self, order_id, version, order, now):
+        created = order.get("created_at")
+        return {
+            "order_id": order_id,
+            "sender": order.get("sender") or order.get("user_data", {}).get("payer_phone"),
+            "status": order.get("status", "pending"),
+            "total_amount": order.get("total_amount", 0),
+            "payment_method": (order.get("payment_method") or "").splitlines()[0] if order.get("payment_method") else None,
+            "created_at": datetime.fromtimestamp(created, timezone.utc) if created else None,
+            "updated_at": now,
+            "data": json.dumps(order),
+            "version": version,
+        }
+
+    def store(self, orders):
+        """Insert new orders and update the ones already archived.
+
+        ``orders`` maps id -> (version, order). An update only applies if its
+        version is newer than the stored row's, so a batch retried late can't
+        roll a status back.
+        """
+        from sqlalchemy import bindparam, select
+        from sqlalchemy.exc import IntegrityError
+
+        if not orders:
+            return
+        now = datetime.now(timezone.utc)
+        rows = [self.order_row(order_id, version, order, now) for order_id, (version, order) in orders.items()]
+        for attempt in range(2):
+            try:
+                with self.engine.begin() as conn:
+                    existing = set(conn.execute(
+                        select(self.orders.c.order_id).where(self.orders.c.order_id.in_(list(orders)))
+                    ).scalars())
+                    new = [row for row in rows if row["order_id"] not in existing]
+                    changed = [
+                        {"key": row["order_id"], "new_status": row["status"],
+                         "new_updated_at": row["updated_at"], "new_data": row["data"],
+                         "new_version": row["version"]}
+                        for row in rows if row["order_id"] in existing
+                    ]
+                    if new:
+                        conn.execute(self.orders.insert(), new)
+                        items = [
+                            {"order_id": row["order_id"], "line": line, "name": item["name"],
+                             "price": item["price"], "quantity": item["quantity"]}
+                            for row in new
+                            for line, item in enumerate(orders[row["order_id"]][1].get("items", []), start=1)
+                        ]
+                        if items:
+                            conn.execute(self.order_items.insert(), items)
+                    if changed:
+                        conn.execute(
+                            self.orders.update()
+                            .where(self.orders.c.order_id == bindparam("key"))
+                            .where(self.orders.c.version < bindparam("new_version"))
+                            .values(status=bindparam("new_status"), updated_at=bindparam("new_updated_at"),
+                                    data=bindparam("new_data"), version=bindparam("new_version")),
+                            changed,
+                        )
+                return
+            except IntegrityError:
+                # Another archiver inserted one of these orders first; retry as updates
+                if attempt:
+                    raise
+
+
+def archive_batch(archive, entries):
+    # Stream order is commit order, so the last entry for an order is its latest state
+    orders = {}
+    for entry_id, fields in entries:
+        try:
+            orders[fields["order_id"]] = (stream_version(entry_id), json.loads(fields["order"]))
+        except (KeyError, ValueError) as e:
+            logging.error(f"❌ Skipping malformed archive entry: {e}")
+    archive.store(orders)
+    ack_messages([entry_id for entry_id, _ in entries], stream=ARCHIVE_STREAM_KEY, group=GROUP)
+    return len(orders)
+
+
+def backfill(archive, batch_size):
+    """Archive every order still in Redis, e.g. ones placed before the archiver ran."""
+    order_ids = redis_client.zrange(ORDERS_BY_TIME_KEY, 0, -1)
+    # As new as a stream entry written now: later changes still win, earlier ones don't
+    seconds, micros = redis_client.time()
+    version = stream_version(f"{seconds * 1000 + micros // 1000}-0")
+    archived = 0
+    for start in range(0, len(order_ids), batch_size):
+        chunk = order_ids[start:start + batch_size]
+        blobs = redis_client.mget([order_key(order_id) for order_id in chunk])
+        orders = {order_id: (version, json.loads(blob)) for order_id, blob in zip(chunk, blobs) if blob}
+        archive.store(orders)
+        archived += len(orders)
+    logging.info(f"📦 Backfilled {archived} order(s) from Redis")
+
+
+def run(archive, consumer, batch_size, block_ms, once=False):
+    while running.is_set():
+        try:
+            entries = read_messages(consumer, batch_size, block_ms, stream=ARCHIVE_STREAM_KEY, group=GROUP)
+        except Exception as e:
+            logging.error(f"❌ {consumer} failed to read the archive stream: {e}")
+            running.wait(1)
+            continue
+        if not entries:
+            if once:
+                return
+            continue
+        try:
+            count = archive_batch(archive, entries)
+            logging.info(f"📦 Archived {count} order(s)")
+        except Exception as e:
+            # Left pending; reclaimed and retried after message_queue.CLAIM_IDLE_MS
+            logging.error(f"❌ Archiving {len(entries)} entries failed: {e}", exc_info=True)
+            running.wait(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive committed orders from Redis into SQL.")
+    parser.add_argument("--batch", type=int, default=500, help="stream entries per SQL transaction")
+    parser.add_argument("--block-ms", type=int, default=5000)
+    parser.add_argument("--name", default=f"{socket.gethostname()}-{os.getpid()}")
+    parser.add_argument("--once", action="store_true", help="exit once the stream is drained")
+    parser.add_argument("--backfill", action="store_true", help="first archive every order still in Redis")
+    args = parser.parse_args()
+    if not ARCHIVE_STREAM_KEY:
+        parser.error("ARCHIVE_STREAM is not set, so no orders are being archived")
+
+    setup_logging()
+    archive = Archive()
+    ensure_group(ARCHIVE_STREAM_KEY, GROUP)
+    if args.backfill:
+        backfill(archive, args.batch)
+
+    running.set()
+    logging.info(f"🗄️ Archiver {args.name} writing to {archive.engine.url.render_as_string(hide_password=True)}")
+    try:
+        run(archive, args.name, args.batch, None if args.once else args.block_ms, args.once)
+    except KeyboardInterrupt:
+        running.clear()
+
+
+if __name__ == "__main__":
+    main()
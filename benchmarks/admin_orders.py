@@ -0,0 +1,61 @@
+"""Redis cost of the admin order commands with many stored orders.
+
+    python benchmarks/admin_orders.py [--orders 20000] [--repeats 200]
+
+Seeds orders through commit_order into the in-process Redis, then times the
+order_store calls behind 'orders today', 'orders pending', 'order <id>' and
+'paid <id>' and counts their Redis round trips. Each should stay at one or
+two round trips however many orders are stored.
+"""
+import argparse
+import logging
+import statistics
+import time
+
+import harness
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the admin order queries.")
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    harness.install()
+    import order_store
+
+    started = time.perf_counter()
+    order_ids = []
+    for i in range(args.orders):
+        order_id = order_store.allocate_order_id()
+        order_store.commit_order(order_id, f"26377{i % 5000:07d}", {
+            'order_id': order_id, 'user_data': {'payer_name': 'Load Test'}, 'items': [],
+            'timestamp': order_store.business_now().isoformat(), 'status': 'pending', 'total_amount': 100.0,
+        })
+        order_ids.append(order_id)
+    print(f"Seeded {args.orders} orders in {time.perf_counter() - started:.1f} s")
+
+    today = order_store.start_of_business_day()
+    queries = {
+        "orders today": lambda: order_store.orders_since(today, 0, 10),
+        "orders today 50": lambda: order_store.orders_since(today, 490, 10),
+        "orders pending": lambda: order_store.orders_with_status("pending", 0, 10),
+        "order <id>": lambda: order_store.get_order(order_ids[len(order_ids) // 2]),
+        "paid <id>": lambda: order_store.set_order_status(order_ids.pop(), "paid"),
+    }
+    for name, query in queries.items():
+        timings = []
+        harness.counters.reset()
+        for _ in range(args.repeats):
+            began = time.perf_counter()
+            query()
+            timings.append((time.perf_counter() - began) * 1000)
+        timings.sort()
+        trips = harness.counters.snapshot()["round_trips"] / args.repeats
+        print(f"{name:<18} median {statistics.median(timings):6.3f} ms   "
+              f"p99 {harness.percentile(timings, 99):6.3f} ms   {trips:.0f} round trips")
+
+
+if __name__ == "__main__":
+    main()
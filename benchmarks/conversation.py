@@ -0,0 +1,202 @@
+"""Per-step latency and Redis cost of complete scripted conversations.
+
+Drives delivery and pickup orders through message_handler against an
+in-process Redis (fakeredis) with the Graph API call stubbed out, then reports
+p50/p95/p99 latency per step plus Redis commands, round trips and bytes per
+message. Results are written as JSON; pass a previous file to --compare to
+fail on regressions.
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/conversation.py --iterations 200 --compare old.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+import harness
+
+DELIVERY = [
+    ("hi", "hi"),
+    ("save_name", "Tendai Moyo"),
+    ("browse_more", "more"),
+    ("browse_back", "back"),
+    ("choose_product", "1"),
+    ("ask_quantity", "2"),
+    ("add_item", "4"),
+    ("search", "rice"),
+    ("choose_search_result", "1"),
+    ("ask_quantity", "1"),
+    ("remove_item", "3"),
+    ("await_remove_item", "1"),
+    ("await_remove_quantity", "1"),
+    ("continue_to_delivery", "1"),
+    ("choose_delivery", "1"),
+    ("get_area", "1"),
+    ("ask_checkout", "1"),
+    ("get_receiver_name", "Rudo Moyo"),
+    ("get_address", "12 Samora Machel Ave, Harare"),
+    ("get_id", "63-123456A42"),
+    ("get_phone", "0771234567"),
+    ("confirm_details", "1"),
+    ("payment", "1"),
+    ("another_order", "2"),
+]
+
+PICKUP = [
+    ("hi", "hi"),
+    ("save_name", "Farai Ncube"),
+    ("choose_product", "1"),
+    ("ask_quantity", "3"),
+    ("continue_to_delivery", "1"),
+    ("choose_pickup", "2"),
+    ("get_receiver_name_pickup", "Farai Ncube"),
+    ("get_phone_pickup", "0772345678"),
+    ("get_id_pickup", "63-654321B42"),
+    ("payment", "1"),
+    ("another_order", "2"),
+]
+
+FLOWS = {"delivery": DELIVERY, "pickup": PICKUP}
+PHONE_ID = os.environ["PHONE_ID"]
+
+
+def run_flow(main, script, sender, samples):
+    for label, text in script:
+        before = harness.counters.snapshot()
+        started = time.perf_counter()
+        main.message_handler(text, sender, PHONE_ID)
+        elapsed = (time.perf_counter() - started) * 1000
+        after = harness.counters.snapshot()
+        samples.setdefault(label, []).append({
+            "ms": elapsed,
+            **{key: after[key] - before[key] for key in ("ops", "round_trips", "bytes_out", "bytes_in")},
+        })
+
+
+def summarize(rows):
+    timings = sorted(row["ms"] for row in rows)
+    count = len(rows)
+    return {
+        "messages": count,
+        "p50_ms": round(harness.percentile(timings, 50), 3),
+        "p95_ms": round(harness.percentile(timings, 95), 3),
+        "p99_ms": round(harness.percentile(timings, 99), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "redis_ops": round(sum(row["ops"] for row in rows) / count, 2),
+        "redis_round_trips": round(sum(row["round_trips"] for row in rows) / count, 2),
+        "redis_bytes_out": round(sum(row["bytes_out"] for row in rows) / count, 1),
+        "redis_bytes_in": round(sum(row["bytes_in"] for row in rows) / count, 1),
+    }
+
+
+def count_orders():
+    return sum(1 for _ in harness.fake_redis().scan_iter("order:*"))
+
+
+def benchmark(iterations, warmup):
+    main = harness.install()
+    samples = {}
+    flow_totals = {name: [] for name in FLOWS}
+    orders_before = 0
+    for i in range(warmup + iterations):
+        if i == warmup:
+            orders_before = count_orders()
+        for offset, (name, script) in enumerate(FLOWS.items()):
+            sender = f"26377{i * len(FLOWS) + offset:07d}"
+            flow_samples = {}
+            run_flow(main, script, sender, flow_samples)
+            if i < warmup:
+                continue
+            for label, rows in flow_samples.items():
+                samples.setdefault(label, []).extend(rows)
+            flow_totals[name].append({
+                key: sum(row[key] for rows in flow_samples.values() for row in rows)
+                for key in ("ms", "ops", "round_trips", "bytes_out", "bytes_in")
+            })
+
+    steps = {label: summarize(rows) for label, rows in samples.items()}
+    everything = [row for rows in samples.values() for row in rows]
+    flows = {name: summarize(rows) for name, rows in flow_totals.items()}
+    orders = count_orders() - orders_before
+    return {
+        "benchmark": "conversation",
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "iterations": iterations,
+        "orders_created": orders,
+        "overall": summarize(everything),
+        "flows": flows,
+        "steps": steps,
+    }
+
+
+def print_report(results):
+    header = f"{'step':<24}{'n':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'ops':>7}{'trips':>7}{'B out':>8}{'B in':>8}"
+    print(header)
+    print("-" * len(header))
+    rows = list(results["steps"].items()) + [("(per message)", results["overall"])]
+    for label, s in rows:
+        print(f"{label:<24}{s['messages']:>6}{s['p50_ms']:>9.3f}{s['p95_ms']:>9.3f}{s['p99_ms']:>9.3f}"
+              f"{s['redis_ops']:>7.1f}{s['redis_round_trips']:>7.1f}{s['redis_bytes_out']:>8.0f}{s['redis_bytes_in']:>8.0f}")
+    for name, s in results["flows"].items():
+        print(f"{name} flow: p50 {s['p50_ms']:.2f} ms, p95 {s['p95_ms']:.2f} ms, "
+              f"{s['redis_ops']:.0f} Redis ops, {s['redis_bytes_out'] + s['redis_bytes_in']:.0f} bytes")
+    print(f"{results['orders_created']} orders created")
+
+
+def compare(results, baseline, tolerance):
+    """Print changes against a previous run; returns the regressed steps."""
+    regressions = []
+    for label, s in results["steps"].items():
+        old = baseline.get("steps", {}).get(label)
+        if not old:
+            continue
+        slower = old["p95_ms"] and s["p95_ms"] > old["p95_ms"] * (1 + tolerance)
+        more_ops = s["redis_ops"] > old["redis_ops"]
+        more_bytes = s["redis_bytes_out"] > old["redis_bytes_out"] * (1 + tolerance)
+        if slower or more_ops or more_bytes:
+            regressions.append(label)
+            print(f"❌ {label}: p95 {old['p95_ms']:.3f} -> {s['p95_ms']:.3f} ms, "
+                  f"ops {old['redis_ops']} -> {s['redis_ops']}, "
+                  f"bytes out {old['redis_bytes_out']:.0f} -> {s['redis_bytes_out']:.0f}")
+    if not regressions:
+        print(f"✅ No step regressed against {baseline.get('created', 'baseline')}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scripted conversations through message_handler.")
+    parser.add_argument("--iterations", type=int, default=100, help="conversations per flow")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(__file__), "results", "conversation.json"))
+    parser.add_argument("--compare", metavar="BASELINE_JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 / bytes growth before failing")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's INFO logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    results = benchmark(args.iterations, args.warmup)
+    print_report(results)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Per-send latency against a local Graph API stand-in.
+
+    python benchmarks/graph_client.py --sends 20 --handshake-ms 80
+
+The stand-in sleeps ``--handshake-ms`` once per new TCP connection to stand in
+for the TLS handshake with graph.facebook.com, then answers every POST like the
+messages endpoint. Sends go first through a bare requests.post per message (how
+send() used to work) and then through graph.post_message, which reuses pooled
+keep-alive connections: only its first send should pay the handshake.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+class GraphStandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    handshake_seconds = 0.0
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        time.sleep(self.handshake_seconds)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"messages": [{"id": "wamid.standin"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(handshake_ms):
+    GraphStandIn.handshake_seconds = handshake_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GraphStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def time_sends(send, count):
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        send()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(label, timings):
+    rest = timings[1:] or timings
+    print(f"{label:<22} first {timings[0]:7.2f} ms   rest median {statistics.median(rest):7.2f} ms   "
+          f"total {sum(timings):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sends", type=int, default=20)
+    parser.add_argument("--handshake-ms", type=float, default=80)
+    args = parser.parse_args()
+
+    server = start_server(args.handshake_ms)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v19.0"
+    os.environ["GRAPH_API_URL"] = base_url
+
+    import requests
+    import graph
+
+    data = {"messaging_product": "whatsapp", "to": "263771234567", "type": "text", "text": {"body": "hi"}}
+    headers = {"Authorization": "Bearer test", "Content-Type": "application/json"}
+
+    bare = time_sends(lambda: requests.post(f"{base_url}/PHONE_ID/messages", headers=headers, json=data).raise_for_status(), args.sends)
+    pooled = time_sends(lambda: graph.post_message("PHONE_ID", "test", data), args.sends)
+
+    report("requests.post", bare)
+    report("graph.post_message", pooled)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""In-process stand-ins shared by the benchmarks.
+
+The app runs unmodified against fakeredis (an in-process Redis) and a stubbed
+Graph API call, so benchmarks need neither a Redis server nor network access.
+Requires the packages in benchmarks/requirements.txt.
+"""
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("OWNER_PHONE", "263700000001")
+os.environ.setdefault("PHONE_ID", "100000000000001")
+# The stubbed Graph API has no send limit; leave the token bucket wide open so
+# timings measure the app rather than the 80/s throttle
+os.environ.setdefault("SEND_RATE_PER_SECOND", "1000000")
+os.environ.setdefault("SEND_BURST", "1000000")
+
+import fakeredis
+from fakeredis import FakeRedisConnection
+
+
+def resp_size(value):
+    """Approximate RESP-encoded size of a decoded reply."""
+    if value is None:
+        return 5
+    if isinstance(value, bool):
+        return 4
+    if isinstance(value, int):
+        return len(str(value)) + 3
+    if isinstance(value, (bytes, str)):
+        length = len(value.encode("utf-8") if isinstance(value, str) else value)
+        return length + len(str(length)) + 5
+    if isinstance(value, dict):
+        return 3 + sum(resp_size(k) + resp_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return 3 + sum(resp_size(item) for item in value)
+    return len(str(value)) + 3
+
+
+class RedisCounters:
+    """Commands, round trips and bytes each way, across every connection."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.ops = 0
+        self.round_trips = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.commands = {}
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "ops": self.ops,
+                "round_trips": self.round_trips,
+                "bytes_out": self.bytes_out,
+                "bytes_in": self.bytes_in,
+                "commands": dict(self.commands),
+            }
+
+
+counters = RedisCounters()
+
+
+class CountingPacker:
+    """Wraps a connection's command packer to count every command it encodes."""
+
+    def __init__(self, packer):
+        self.packer = packer
+
+    def pack(self, *args):
+        name = args[0].decode() if isinstance(args[0], bytes) else str(args[0])
+        with counters.lock:
+            counters.ops += 1
+            counters.commands[name] = counters.commands.get(name, 0) + 1
+        return self.packer.pack(*args)
+
+
+class CountingConnection(FakeRedisConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._command_packer = CountingPacker(self._command_packer)
+
+    def send_packed_command(self, command, check_health=True):
+        chunks = [command] if isinstance(command, (str, bytes)) else command
+        with counters.lock:
+            counters.round_trips += 1
+            counters.bytes_out += sum(len(chunk) for chunk in chunks)
+        return super().send_packed_command(command, check_health)
+
+    def read_response(self, **kwargs):
+        response = super().read_response(**kwargs)
+        with counters.lock:
+            counters.bytes_in += resp_size(response)
+        return response
+
+
+class StubResponse:
+    status_code = 200
+    text = '{"messages":[{"id":"wamid.stub"}]}'
+
+
+graph_calls = {"count": 0}
+_graph_lock = threading.Lock()
+# Seconds each stubbed Graph API call takes, to stand in for the real round trip
+graph_latency = 0.0
+
+
+def stub_post_message(phone_id, token, data):
+    if graph_latency:
+        time.sleep(graph_latency)
+    with _graph_lock:
+        graph_calls["count"] += 1
+    return StubResponse()
+
+
+_client = None
+
+
+def fake_redis():
+    """The fakeredis client behind the app, for checking results."""
+    return _client
+
+
+def install(stock=10 ** 6, graph_latency_ms=0):
+    """Point the app at a fresh fakeredis and a stubbed Graph API; returns main."""
+    import db
+    global _client, graph_latency
+    graph_latency = graph_latency_ms / 1000
+    client = _client = fakeredis.FakeStrictRedis(decode_responses=True, connection_class=CountingConnection)
+    db.redis_client.use(client)
+
+    import main
+    main.post_message = stub_post_message
+
+    # Plenty of stock so repeated checkouts keep following the happy path
+    import inventory
+    inventory.seed_inventory()
+    for product in inventory.get_catalog().order_system.get_all_products():
+        client.hset(inventory.INVENTORY_KEY, product.name, stock)
+    inventory.invalidate_availability()
+    counters.reset()
+    return main
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
@@ -0,0 +1,111 @@
+"""Cold-start cost of the app, checked against budgets.
+
+    python benchmarks/import_time.py [--budget-ms 350] [--ready-budget-ms 600] [--runs 5]
+
+Runs a cold start in fresh interpreters under ``python -X importtime``:
+``import main``, then the setup the first webhook POST triggers before it
+can answer (the first metric, the Redis client and the Graph API session),
+without any network I/O. Takes the fastest run and reports main's cumulative
+import time and the time until the process is ready for that first request,
+with what each deferred module costs.
+
+Exits non-zero when either exceeds its budget, or when a module that should
+only load on first use (the Redis and HTTP clients, metrics) is imported by
+``import main``. Deferring a module only moves its cost to the first request,
+so the ready budget is what a cold invocation actually pays.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+# Loaded lazily on first Redis command / first outbound send / first metric
+DEFERRED_MODULES = ("redis", "requests", "prometheus_client")
+
+
+# A cold process: import main, then what its first webhook POST sets up
+COLD_START = """
+import time
+started = time.perf_counter()
+import main
+import db, graph
+main.count_webhook_request("POST")
+db.redis_client.connection_pool
+graph.get_session()
+print(round((time.perf_counter() - started) * 1e6))
+"""
+
+
+def measure():
+    """(main's subtree as {module: cumulative us}, {deferred module: us}, us until ready)."""
+    env = dict(os.environ, REDIS_URL=os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", COLD_START],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    # Children are printed before their parent; keep only the entries that
+    # belong to main's subtree, not interpreter startup (site, encodings, ...),
+    # and the deferred modules imported after it
+    modules = {}
+    deferred = {}
+    pending = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = len(name) - len(name.lstrip()) - 1
+        pending[name.strip()] = int(cumulative)
+        if depth == 0:
+            if name.strip() == "main":
+                modules = pending
+            elif modules and name.strip() in DEFERRED_MODULES:
+                deferred[name.strip()] = int(cumulative)
+            pending = {}
+    return modules, deferred, int(result.stdout.split()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the cold-start import budget.")
+    parser.add_argument("--budget-ms", type=float, default=350, help="for import main")
+    parser.add_argument("--ready-budget-ms", type=float, default=600,
+                        help="for import main plus the first request's setup")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    best, deferred, ready_us = min(runs, key=lambda run: run[2])
+    total_ms = best["main"] / 1000
+    ready_ms = ready_us / 1000
+
+    top_level = sorted(
+        ((us, name) for name, us in best.items() if name != "main"), reverse=True
+    )[:args.top]
+    print(f"import main: {total_ms:.1f} ms (best of {args.runs}, budget {args.budget_ms:.0f} ms)")
+    for us, name in top_level:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+    print(f"ready for the first request: {ready_ms:.1f} ms (budget {args.ready_budget_ms:.0f} ms)")
+    for name in DEFERRED_MODULES:
+        if name in deferred:
+            print(f"  {deferred[name] / 1000:8.1f} ms  {name} (deferred to the first request)")
+
+    failed = False
+    eager = [name for name in DEFERRED_MODULES if name in best]
+    if eager:
+        print(f"FAIL: imported at startup but should be deferred: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"FAIL: import time {total_ms:.1f} ms exceeds budget of {args.budget_ms:.0f} ms")
+        failed = True
+    if ready_ms > args.ready_budget_ms:
+        print(f"FAIL: cold start {ready_ms:.1f} ms exceeds budget of {args.ready_budget_ms:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
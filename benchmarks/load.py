@@ -0,0 +1,336 @@
+"""Load test the /webhook endpoint with simulated customers.
+
+Serves the Flask app on a local port and POSTs WhatsApp Cloud API webhook
+payloads at a target rate. Each virtual user walks a plausible ordering
+conversation, one message at a time: browsing, searching, adding and
+removing items, delivery or pickup checkout and payment. Some users give up
+half way. Redis is fakeredis and the Graph API is stubbed with a fixed
+latency, so nothing leaves the machine.
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/load.py --users 2000 --rate 100 --concurrency 32
+    python benchmarks/load.py --mode queue --workers 8 --rate 200
+
+In inline mode the webhook request does the work, so request latency is what
+customers see. In queue mode the request only enqueues; worker threads drain
+the stream, and end-to-end latency runs until a worker has finished the
+message. Latencies are measured from each message's scheduled send time, so
+a backlog in the client shows up in the numbers instead of hiding.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import harness
+
+import requests
+from werkzeug.serving import make_server
+
+NAMES = ["Tendai Moyo", "Rudo Ncube", "Farai Dube", "Nyasha Sibanda", "Tatenda Phiri",
+         "Chipo Banda", "Kudzai Mhlanga", "Rumbi Chikore", "Tafadzwa Zhou", "Vimbai Nkomo"]
+SEARCHES = ["rice", "mazoe", "cooking oil", "sugar", "milk", "bread flour", "soap", "tea", "beans", "maize meal"]
+ADDRESSES = ["12 Samora Machel Ave", "45 Chiremba Rd", "8 Seke Rd", "101 Borrowdale Rd", "3 Glen View 7"]
+
+
+def conversation(rng):
+    """One customer's messages, in order."""
+    name = rng.choice(NAMES)
+    script = ["hi", name]
+    script += ["more"] * rng.randint(0, 2)
+
+    for item in range(rng.choices([1, 2, 3], weights=[5, 3, 2])[0]):
+        if item:
+            script.append("4")
+        if rng.random() < 0.4:
+            script += [rng.choice(SEARCHES), "1"]
+        else:
+            script.append(str(rng.randint(1, 8)))
+        script.append(str(rng.randint(1, 5)))
+
+    if rng.random() < 0.15:
+        script += ["3", "1", "1"]
+    if rng.random() < 0.2:
+        # Abandoned cart: stops somewhere before paying
+        return script[:rng.randint(2, len(script))]
+
+    script.append("1")
+    if rng.random() < 0.7:
+        script += ["1", str(rng.randint(1, 13)), "1",
+                   name, rng.choice(ADDRESSES), f"63-{rng.randint(100000, 999999)}A42",
+                   f"077{rng.randint(1000000, 9999999)}", "1"]
+    else:
+        script += ["2", name, f"077{rng.randint(1000000, 9999999)}", f"63-{rng.randint(100000, 999999)}B42"]
+    script += [str(rng.randint(1, 5)), "2"]
+    return script
+
+
+def webhook_payload(sender, text, phone_id):
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "102290129340398",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "263780000000", "phone_number_id": phone_id},
+                    "contacts": [{"profile": {"name": "Customer"}, "wa_id": sender}],
+                    "messages": [{
+                        "from": sender,
+                        "id": f"wamid.{uuid.uuid4().hex}",
+                        "timestamp": str(int(time.time())),
+                        "type": "text",
+                        "text": {"body": text},
+                    }],
+                },
+            }],
+        }],
+    }
+
+
+class VirtualUser:
+    def __init__(self, number, rng):
+        self.sender = f"26371{number:07d}"
+        self.script = conversation(rng)
+        self.position = 0
+
+    def next_message(self):
+        text = self.script[self.position]
+        self.position += 1
+        return text
+
+    @property
+    def finished(self):
+        return self.position >= len(self.script)
+
+
+class ErrorCounter(logging.Handler):
+    """Counts ERROR records the app logs; the webhook itself always answers 200."""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+        self.samples = []
+
+    def emit(self, record):
+        self.count += 1
+        if len(self.samples) < 5:
+            self.samples.append(record.getMessage()[:200])
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.ready = deque()
+        self.pending = {}
+        self.started_users = 0
+        self.finished_users = 0
+        self.in_flight = 0
+        self.sent = 0
+        self.http_errors = 0
+        self.idle_ticks = 0
+        self.request_ms = []
+        self.end_to_end_ms = []
+        self.all_done = threading.Event()
+        self.local = threading.local()
+
+    def session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def next_user(self):
+        with self.lock:
+            if self.ready:
+                return self.ready.popleft()
+            if self.started_users < self.args.users:
+                self.started_users += 1
+                return VirtualUser(self.started_users, self.rng)
+            return None
+
+    def message_done(self, user, scheduled):
+        with self.lock:
+            self.end_to_end_ms.append((time.perf_counter() - scheduled) * 1000)
+            self.in_flight -= 1
+            if user.finished:
+                self.finished_users += 1
+            else:
+                self.ready.append(user)
+            if self.finished_users == self.args.users:
+                self.all_done.set()
+
+    def post(self, url, user, text, scheduled):
+        payload = webhook_payload(user.sender, text, os.environ["PHONE_ID"])
+        if self.args.mode == "queue":
+            with self.lock:
+                self.pending[user.sender] = (user, scheduled)
+        try:
+            response = self.session().post(url, json=payload, timeout=30)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        with self.lock:
+            self.request_ms.append((time.perf_counter() - scheduled) * 1000)
+            if not ok:
+                self.http_errors += 1
+        if self.args.mode == "inline" or not ok:
+            if not ok:
+                with self.lock:
+                    self.pending.pop(user.sender, None)
+            self.message_done(user, scheduled)
+
+    def worker_finished(self, sender):
+        with self.lock:
+            user, scheduled = self.pending.pop(sender, (None, None))
+        if user is not None:
+            self.message_done(user, scheduled)
+
+    def run(self, url):
+        interval = 1 / self.args.rate
+        deadline = time.perf_counter() + self.args.duration
+        next_send = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as client:
+            while not self.all_done.is_set() and time.perf_counter() < deadline:
+                delay = next_send - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                scheduled = next_send
+                next_send += interval
+
+                user = self.next_user()
+                if user is None:
+                    # Every live user is waiting on a reply; the pool is too small for this rate
+                    self.idle_ticks += 1
+                    continue
+                with self.lock:
+                    self.in_flight += 1
+                    self.sent += 1
+                client.submit(self.post, url, user, user.next_message(), scheduled)
+            self.all_done.wait(max(0, deadline - time.perf_counter()))
+
+
+def start_workers(count, test):
+    import worker
+
+    handle_message = worker.handle_message
+
+    def tracked(sender, prompt, phone_id):
+        try:
+            handle_message(sender, prompt, phone_id)
+        finally:
+            test.worker_finished(sender)
+
+    worker.handle_message = tracked
+    worker.ensure_group()
+    worker.running.set()
+    threads = [threading.Thread(target=worker.consume, args=(f"load-{i}",), daemon=True) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return worker
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        "p50_ms": round(harness.percentile(values, 50), 2),
+        "p95_ms": round(harness.percentile(values, 95), 2),
+        "p99_ms": round(harness.percentile(values, 99), 2),
+        "max_ms": round(values[-1], 2) if values else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /webhook with simulated customers.")
+    parser.add_argument("--users", type=int, default=1000, help="virtual customers to run")
+    parser.add_argument("--rate", type=float, default=100, help="target webhook POSTs per second")
+    parser.add_argument("--concurrency", type=int, default=32, help="client connections")
+    parser.add_argument("--duration", type=float, default=300, help="stop after this many seconds")
+    parser.add_argument("--mode", choices=["inline", "queue"], default="inline")
+    parser.add_argument("--workers", type=int, default=4, help="worker threads in queue mode")
+    parser.add_argument("--graph-latency-ms", type=float, default=80, help="time each Graph API send takes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's INFO logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+        logging.getLogger().handlers.clear()
+    errors = ErrorCounter()
+    logging.getLogger().addHandler(errors)
+
+    app_main = harness.install(graph_latency_ms=args.graph_latency_ms)
+    app_main.inbound_mode = args.mode
+    test = LoadTest(args)
+    if args.mode == "queue":
+        worker = start_workers(args.workers, test)
+
+    server = make_server("127.0.0.1", 0, app_main.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/webhook"
+
+    print(f"Running {args.users} users at {args.rate:g} msg/s ({args.mode} mode) against {url}")
+    started = time.perf_counter()
+    test.run(url)
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+    if args.mode == "queue":
+        worker.running.clear()
+
+    orders = sum(1 for _ in harness.fake_redis().scan_iter("order:*"))
+    results = {
+        "benchmark": "webhook_load",
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "mode": args.mode,
+        "workers": args.workers if args.mode == "queue" else None,
+        "target_rate": args.rate,
+        "graph_latency_ms": args.graph_latency_ms,
+        "elapsed_s": round(elapsed, 2),
+        "messages_sent": test.sent,
+        "messages_completed": len(test.end_to_end_ms),
+        "throughput_per_s": round(len(test.end_to_end_ms) / elapsed, 1),
+        "users_started": test.started_users,
+        "users_finished": test.finished_users,
+        "orders_created": orders,
+        "graph_sends": harness.graph_calls["count"],
+        "http_errors": test.http_errors,
+        "app_errors": errors.count,
+        "error_rate": round((test.http_errors + errors.count) / max(test.sent, 1), 4),
+        "idle_ticks": test.idle_ticks,
+        "request_latency": summarize(test.request_ms),
+        "end_to_end_latency": summarize(test.end_to_end_ms),
+        "redis": {key: value for key, value in harness.counters.snapshot().items() if key != "commands"},
+    }
+
+    req, e2e = results["request_latency"], results["end_to_end_latency"]
+    print(f"{results['messages_completed']}/{test.sent} messages in {elapsed:.1f} s "
+          f"= {results['throughput_per_s']} msg/s (target {args.rate:g})")
+    print(f"request     p50 {req['p50_ms']:8.1f}  p95 {req['p95_ms']:8.1f}  p99 {req['p99_ms']:8.1f}  max {req['max_ms']:8.1f} ms")
+    print(f"end-to-end  p50 {e2e['p50_ms']:8.1f}  p95 {e2e['p95_ms']:8.1f}  p99 {e2e['p99_ms']:8.1f}  max {e2e['max_ms']:8.1f} ms")
+    print(f"{test.finished_users}/{test.started_users} users finished, {orders} orders created, "
+          f"{results['graph_sends']} Graph API sends")
+    print(f"errors: {test.http_errors} HTTP, {errors.count} logged by the app ({results['error_rate']:.2%})")
+    for sample in errors.samples:
+        print(f"  ❌ {sample}")
+    if test.idle_ticks:
+        print(f"⚠️ {test.idle_ticks} send slots skipped: every started user was waiting on a reply")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+"""Product search latency over the full catalog.
+
+    python benchmarks/search.py [repeats]
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from orders import get_catalog
+
+QUERIES = ["rice", "mazoe", "maz", "mazeo orange", "milk powder", "toothpaste", "cooking oil 2l", "nan", "xyz"]
+
+
+def main(repeats=2000):
+    catalog = get_catalog()
+    print(f"{len(catalog.search_index.products)} products, {len(catalog.search_index.grams)} trigrams indexed")
+    for query in QUERIES:
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            results = catalog.search(query)
+            timings.append((time.perf_counter() - started) * 1e6)
+        timings.sort()
+        print(f"{query!r:<18} {len(results):2d} hits   median {statistics.median(timings):6.1f} us   "
+              f"p99 {timings[int(len(timings) * 0.99)]:6.1f} us")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,78 @@
+"""Bytes per stored session, old layout vs the current compact one.
+
+    python benchmarks/session_size.py
+
+Builds a typical mid-checkout session (a cart of catalog products plus the
+delivery fee line, at the get_area step) and prints the JSON size of each
+encoding, plus what that means for N concurrent carts.
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+from main import User, DELIVERY_AREAS
+from orders import get_catalog
+from products import Product
+
+
+def legacy_state(user, catalog, selected):
+    # Layout used before sessions referenced the catalog by id
+    return {
+        'step': 'get_area',
+        'sender': user.payer_phone,
+        'phone_number': user.payer_phone,
+        'user': {
+            "payer_name": user.payer_name,
+            "payer_phone": user.payer_phone,
+            "cart": [{
+                "product": {
+                    "name": item["product"].name,
+                    "price": item["product"].price,
+                    "description": item["product"].description
+                },
+                "quantity": item["quantity"]
+            } for item in user.cart],
+            "checkout_data": user.checkout_data
+        },
+        'category_names': list(catalog.category_names),
+        'current_category_index': 3,
+        'selected_product': selected.__dict__,
+        'delivery_areas': DELIVERY_AREAS,
+        'area_names': list(DELIVERY_AREAS.keys()),
+    }
+
+
+def compact_state(user, catalog, selected):
+    return {
+        'step': 'get_area',
+        'sender': user.payer_phone,
+        'phone_number': user.payer_phone,
+        'user': user.to_dict(),
+        'catalog_version': catalog.version,
+        'current_category_index': 3,
+        'selected_product': selected.id,
+    }
+
+
+def main(cart_size=8, sessions=50000):
+    catalog = get_catalog()
+    products = catalog.order_system.get_all_products()
+    user = User("Mildred Moyo", "263771234567")
+    for i in range(cart_size):
+        user.add_to_cart(products[(i * 23) % len(products)], 1 + i % 3)
+    user.add_to_cart(Product("Delivery to Harare", DELIVERY_AREAS["Harare"], "Delivery fee"), 1)
+    selected = products[0]
+
+    before = len(json.dumps(legacy_state(user, catalog, selected)).encode("utf-8"))
+    after = len(json.dumps(compact_state(user, catalog, selected)).encode("utf-8"))
+    print(f"cart lines:            {len(user.cart)}")
+    print(f"bytes/session before:  {before}")
+    print(f"bytes/session after:   {after}  ({100 * (before - after) / before:.0f}% smaller)")
+    print(f"{sessions} sessions:      {before * sessions / 2**20:.1f} MiB -> {after * sessions / 2**20:.1f} MiB (values only)")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+
+redis_url = os.environ.get("REDIS_URL")
+
+
+class LazyRedis:
+    """Stands in for the Redis client until first use.
+
+    Importing redis and building the connection pool is deferred so a cold
+    start only pays for it when a request actually touches Redis.
+    """
+
+    def __init__(self, url):
+        self._url = url
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = instrumented_client_class().from_url(self._url, decode_responses=True)
+        return self._client
+
+    def use(self, client):
+        """Point every module at ``client`` instead (e.g. an in-process stand-in)."""
+        self._client = client
+
+    def __getattr__(self, name):
+        return getattr(self._get_client(), name)
+
+
+def instrumented_client_class():
+    """A StrictRedis that records per-command latency and errors in metrics.
+
+    Pipelines are timed as a whole, labelled PIPELINE or MULTI.
+    """
+    import redis
+    from redis.client import Pipeline
+    from metrics import observe_redis
+
+    def timed(command, call, *args, **options):
+        started = time.perf_counter()
+        try:
+            result = call(*args, **options)
+        except redis.RedisError as e:
+            observe_redis(command, time.perf_counter() - started, e)
+            raise
+        observe_redis(command, time.perf_counter() - started)
+        return result
+
+    class InstrumentedPipeline(Pipeline):
+        def immediate_execute_command(self, *args, **options):
+            return timed(str(args[0]).upper(), super().immediate_execute_command, *args, **options)
+
+        def execute(self, raise_on_error=True):
+            if not self.command_stack:
+                return super().execute(raise_on_error)
+            return timed("MULTI" if self.transaction else "PIPELINE", super().execute, raise_on_error)
+
+    class InstrumentedRedis(redis.StrictRedis):
+        def execute_command(self, *args, **options):
+            return timed(str(args[0]).upper(), super().execute_command, *args, **options)
+
+        def pipeline(self, transaction=True, shard_hint=None):
+            return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+    return InstrumentedRedis
+
+
+# Redis client setup
+redis_client = LazyRedis(redis_url)
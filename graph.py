@@ -0,0 +1,85 @@
+import os
+import random
+import threading
+import time
+
+GRAPH_API_URL = os.environ.get("GRAPH_API_URL", "https://graph.facebook.com/v19.0")
+
+# (connect, read) seconds; a hung Graph API connection must never pin a worker
+CONNECT_TIMEOUT = float(os.environ.get("GRAPH_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.environ.get("GRAPH_READ_TIMEOUT", 10))
+
+# Keep-alive connections held open per host
+POOL_SIZE = int(os.environ.get("GRAPH_POOL_SIZE", 20))
+
+MAX_RETRIES = 3
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8
+# Longest Retry-After we are willing to sleep through inside a request
+MAX_RETRY_AFTER = 30
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Module-wide requests.Session so sends reuse pooled TLS connections."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                # Imported here so a cold start doesn't pay for requests until the first send
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def retry_delay(attempt, response=None):
+    """Seconds to wait before retry number ``attempt`` (0-based)."""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(max(float(retry_after), 0), MAX_RETRY_AFTER)
+            except ValueError:
+                pass
+    # Full jitter keeps workers that failed together from retrying together
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def post_message(phone_id, token, data):
+    """POST a message to the Graph API, retrying throttling and server errors.
+
+    Connection failures are retried too, but read timeouts are not: the
+    message may already have been delivered. Returns the final response and
+    raises requests.HTTPError if it is still an error.
+    """
+    url = f"{GRAPH_API_URL}/{phone_id}/messages"
+    headers = {
+        'Authorization': f'Bearer {token}',
+        'Content-Type': 'application/json'
+    }
+    import requests
+
+    session = get_session()
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = session.post(url, headers=headers, json=data, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        except requests.exceptions.ConnectionError:
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(retry_delay(attempt))
+            continue
+
+        if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+            time.sleep(retry_delay(attempt, response))
+            continue
+        response.raise_for_status()
+        return response
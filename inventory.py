@@ -0,0 +1,151 @@
+import threading
+import time
+from db import redis_client
+from orders import get_catalog
+
+# Stock for every catalog product lives in one Redis hash: product name -> units
+INVENTORY_KEY = "inventory"
+
+# How long a worker trusts its local copy of which products are sold out
+AVAILABILITY_TTL = 5
+
+# Check every cart line first and only then decrement, so a checkout either
+# takes all of its stock or none of it. Products missing from the hash are
+# not tracked and never block a checkout.
+RESERVE_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    local stock = redis.call('HGET', KEYS[1], ARGV[i])
+    if stock and tonumber(stock) < tonumber(ARGV[i + 1]) then
+        return ARGV[i]
+    end
+end
+for i = 1, #ARGV, 2 do
+    if redis.call('HEXISTS', KEYS[1], ARGV[i]) == 1 then
+        redis.call('HINCRBY', KEYS[1], ARGV[i], -tonumber(ARGV[i + 1]))
+    end
+end
+return false
+"""
+
+# Puts back what RESERVE_SCRIPT took, for a checkout that failed after reserving
+RELEASE_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    if redis.call('HEXISTS', KEYS[1], ARGV[i]) == 1 then
+        redis.call('HINCRBY', KEYS[1], ARGV[i], tonumber(ARGV[i + 1]))
+    end
+end
+"""
+
+_reserve = None
+_release = None
+_seeded_for = None
+_lock = threading.Lock()
+_availability = {"expires": 0, "unavailable": frozenset()}
+
+
+def seed_inventory():
+    """Copy catalog stock into Redis for products it doesn't know about yet.
+
+    Runs once per loaded catalog, so products added by a reload get seeded too.
+    """
+    global _seeded_for
+    order_system = get_catalog().order_system
+    if _seeded_for is order_system:
+        return
+    with _lock:
+        if _seeded_for is order_system:
+            return
+        pipe = redis_client.pipeline(transaction=False)
+        for product in order_system.get_all_products():
+            pipe.hsetnx(INVENTORY_KEY, product.name, product.stock)
+        pipe.execute()
+        _seeded_for = order_system
+
+
+def unavailable_products():
+    """Names of sold-out products, refreshed from Redis at most every AVAILABILITY_TTL seconds."""
+    now = time.monotonic()
+    if now < _availability["expires"]:
+        return _availability["unavailable"]
+    seed_inventory()
+    stock = redis_client.hgetall(INVENTORY_KEY)
+    unavailable = frozenset(name for name, units in stock.items() if int(units) <= 0)
+    if unavailable != _availability["unavailable"]:
+        _availability["unavailable"] = unavailable
+    _availability["expires"] = now + AVAILABILITY_TTL
+    return _availability["unavailable"]
+
+
+def invalidate_availability():
+    _availability["expires"] = 0
+
+
+def current_catalog():
+    """Catalog snapshot with sold-out products marked in the menus and left out of search."""
+    return get_catalog(unavailable_products())
+
+
+def stock_args(cart_items):
+    """Flat [name, quantity, ...] for the catalog products among (product, quantity) pairs."""
+    catalog = get_catalog()
+    quantities = {}
+    for product, quantity in cart_items:
+        known = catalog.find_product(product.name)
+        if known is not None:
+            quantities[known.name] = quantities.get(known.name, 0) + quantity
+    args = []
+    for name, quantity in quantities.items():
+        args.extend([name, quantity])
+    return args
+
+
+def reserve_stock(cart_items):
+    """Atomically take stock for (product, quantity) pairs.
+
+    Returns None on success, or the name of the first product without enough
+    stock, in which case nothing was decremented.
+    """
+    global _reserve
+    args = stock_args(cart_items)
+    if not args:
+        return None
+
+    seed_inventory()
+    if _reserve is None:
+        _reserve = redis_client.register_script(RESERVE_SCRIPT)
+    failed = _reserve(keys=[INVENTORY_KEY], args=args)
+    invalidate_availability()
+    return failed
+
+
+def release_stock(cart_items):
+    """Give back stock taken by a successful reserve_stock(cart_items)."""
+    global _release
+    args = stock_args(cart_items)
+    if not args:
+        return
+    if _release is None:
+        _release = redis_client.register_script(RELEASE_SCRIPT)
+    _release(keys=[INVENTORY_KEY], args=args)
+    invalidate_availability()
+
+
+def set_stock(product_name, new_stock):
+    """Set stock for whatever the admin typed: a full or partial name, or a product code."""
+    matches, total = get_catalog().resolve_product(product_name)
+    if not matches:
+        return f"❌ Product *{product_name}* not found."
+    if len(matches) > 1:
+        options = "\n".join(f"• {p.name} (code {p.id})" for p in matches)
+        if total > len(matches):
+            options += f"\n…and {total - len(matches)} more. Add more of the name to narrow it down."
+        return (
+            f"❓ *{product_name}* matches several products:\n{options}\n\n"
+            f"Send it again with the code, e.g. stock {matches[0].id} {new_stock}"
+        )
+
+    product = matches[0]
+    seed_inventory()
+    redis_client.hset(INVENTORY_KEY, product.name, new_stock)
+    invalidate_availability()
+    return f"✅ Stock for *{product.name}* set to {new_stock}."
@@ -0,0 +1,132 @@
+"""Logging setup: structured lines written from a background thread.
+
+LOG_LEVEL sets the root level (INFO by default) and LOG_FORMAT picks "json"
+lines or plain "text". Records go onto a queue and a listener thread formats
+and writes them, so a slow stream never holds up a request; LOG_ASYNC=0
+writes inline instead.
+
+Full webhook payloads and outgoing messages are only logged at DEBUG, for
+LOG_PAYLOAD_SAMPLE_RATE of calls, and with customer details redacted.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+LOG_ASYNC = os.environ.get("LOG_ASYNC", "1") != "0"
+PAYLOAD_SAMPLE_RATE = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", 0.1))
+
+# Checkout details, names and free text are dropped; phone numbers keep their last digits
+PII_FIELDS = {"receiver_name", "receiver_id", "address", "phone", "payer_name", "name", "body", "prompt"}
+PHONE_FIELDS = {"from", "to", "wa_id", "sender", "recipient", "payer_phone", "phone_number"}
+REDACTED = "[redacted]"
+
+# Attributes every LogRecord has; anything else came in through extra=
+RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_configured = False
+
+
+def mask_phone(number):
+    number = str(number)
+    return "*" * max(len(number) - 4, 0) + number[-4:]
+
+
+def redact(value):
+    """Copy of value with PII_FIELDS removed and PHONE_FIELDS masked, at any depth."""
+    if isinstance(value, dict):
+        redacted = {}
+        for key, item in value.items():
+            if key in PII_FIELDS and item not in (None, ""):
+                redacted[key] = REDACTED
+            elif key in PHONE_FIELDS and isinstance(item, (str, int)):
+                redacted[key] = mask_phone(item)
+            else:
+                redacted[key] = redact(item)
+        return redacted
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+def record_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in RECORD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(record_fields(record))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = record_fields(record)
+        if fields:
+            line += " " + json.dumps(fields, default=str, ensure_ascii=False)
+        return line
+
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    """Queues records with the message and traceback rendered but not yet formatted."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging():
+    """Point the root logger at a queue drained by a background writer. Safe to call twice."""
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    root = logging.getLogger()
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+    root.setLevel(LOG_LEVEL)
+
+    if not LOG_ASYNC:
+        root.addHandler(stream)
+        return
+
+    records = queue.SimpleQueue()
+    root.addHandler(RecordQueueHandler(records))
+    listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+
+def log_payload(message, payload, **fields):
+    """Log a redacted copy of payload at DEBUG, for a sample of calls."""
+    logger = logging.getLogger()
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < PAYLOAD_SAMPLE_RATE:
+        logger.debug(message, extra={"payload": redact(payload), **fields})
@@ -1,32 +1,74 @@
 import os
 import logging
-import requests
-import random
-import string
-from datetime import datetime
+import time
 from flask import Flask, request, jsonify, render_template
-import redis
-import json
 import traceback
-from orders import OrderSystem
+from concurrent.futures import ThreadPoolExecutor, wait
+from graph import post_message
+from outbound import dispatch, outbound_batch
+from orders import get_catalog
+from inventory import current_catalog, release_stock, reserve_stock, set_stock
+from logs import log_payload, mask_phone, setup_logging
+from message_queue import claim_message_id, enqueue_message, release_message_id
+from metrics import (count_order, count_webhook_message, count_webhook_request, observe_handler,
+                     observe_send, render as render_metrics)
+from order_store import (allocate_order_id, business_now, commit_order, get_order, orders_since,
+                         orders_with_status, set_order_status, start_of_business_day, user_order_history)
 from products import Category, Product
+from ratelimit import bucket_status, wait_for_send_slot
+from session import (LeaseTimeout, SessionConflict, SessionUnavailable, get_user_state, update_user_state,
+                     sender_lease, user_session)
 
-logging.basicConfig(level=logging.INFO)
+setup_logging()
 
 # Environment variables
 wa_token = os.environ.get("WA_TOKEN")
 phone_id = os.environ.get("PHONE_ID")
 gen_api = os.environ.get("GEN_API")
 owner_phone = os.environ.get("OWNER_PHONE")
-redis_url = os.environ.get("REDIS_URL")
+# "inline" handles messages inside the webhook request, "queue" hands them to worker.py
+inbound_mode = os.environ.get("INBOUND_MODE", "inline")
+# Threads used to run different senders from one batched webhook delivery in parallel
+webhook_threads = int(os.environ.get("WEBHOOK_THREADS", 8))
 ADMIN_NUMBERS = [
     "263719835124",  
     "263772210415"
 ]
 
+# Steps where 'more' and 'back' page through the category menus
+BROWSING_STEPS = ('choose_product', 'choose_search_result')
+
+# Matches listed for a product search
+SEARCH_RESULTS = 8
+
+# Orders listed for a customer's 'my orders'
+MY_ORDERS_SHOWN = 5
+
+# Orders per page for the admin 'orders today' / 'orders pending' commands
+ADMIN_ORDERS_PAGE_SIZE = 10
+
+# WhatsApp rejects text bodies over 4096 characters
+MAX_REPLY_CHARS = 4000
+
+# Bump when the layout of User.to_dict() changes
+SESSION_VERSION = 2
+
+DELIVERY_AREAS = {
+    "Harare": 240,
+    "Chitungwiza": 300,
+    "Mabvuku": 300,
+    "Ruwa": 300,
+    "Domboshava": 250,
+    "Southlea": 300,
+    "Southview": 300,
+    "Epworth": 300,
+    "Mazoe": 300,
+    "Chinhoyi": 350,
+    "Banket": 350,
+    "Rusape": 400,
+    "Dema": 300
+}
 
-# Redis client setup
-redis_client = redis.StrictRedis.from_url(redis_url, decode_responses=True)
 
 class User:
     def __init__(self, payer_name, payer_phone):
@@ -55,57 +97,57 @@ class User:
         return sum(item["product"].price * item["quantity"] for item in self.cart)
 
     def to_dict(self):
+        # Catalog products are stored as [product_id, quantity]; anything else
+        # (the delivery fee line) as [name, price, quantity]
+        catalog = get_catalog()
+        cart = []
+        for item in self.cart:
+            product = item["product"]
+            if catalog.get_product(product.id) is not None:
+                cart.append([product.id, item["quantity"]])
+            else:
+                cart.append([product.name, product.price, item["quantity"]])
         return {
+            "v": SESSION_VERSION,
             "payer_name": self.payer_name,
             "payer_phone": self.payer_phone,
-            "cart": [{
-                "product": {
-                    "name": item["product"].name,
-                    "price": item["product"].price,
-                    "description": item["product"].description
-                },
-                "quantity": item["quantity"]
-            } for item in self.cart],
+            "cart": cart,
             "checkout_data": self.checkout_data
         }
 
     @classmethod
     def from_dict(cls, data):
         user = cls(data["payer_name"], data["payer_phone"])
-        user.cart = [{
-            "product": Product(
-                item["product"]["name"],
-                float(item["product"]["price"]),
-                item["product"].get("description", "")
-            ),
-            "quantity": int(item["quantity"])
-        } for item in data.get("cart", [])]
+        if data.get("v") != SESSION_VERSION:
+            # Sessions written before carts referenced catalog ids
+            user.cart = [{
+                "product": Product(
+                    item["product"]["name"],
+                    float(item["product"]["price"]),
+                    item["product"].get("description", "")
+                ),
+                "quantity": int(item["quantity"])
+            } for item in data.get("cart", [])]
+        else:
+            catalog = get_catalog()
+            for line in data.get("cart", []):
+                if len(line) == 2:
+                    product = catalog.get_product(line[0])
+                    if product is None:
+                        logging.warning(f"Dropping unknown product {line[0]} from cart of {mask_phone(user.payer_phone)}")
+                        continue
+                else:
+                    product = Product(line[0], float(line[1]))
+                user.cart.append({"product": product, "quantity": int(line[-1])})
         user.checkout_data = data.get("checkout_data", {})
         return user
 
-# Redis state functions
-def get_user_state(phone_number):
-    state_json = redis_client.get(f"user_state:{phone_number}")
-    if state_json:
-        return json.loads(state_json)
-    return {'step': 'ask_name', 'sender': phone_number}
-
-def update_user_state(phone_number, updates):
-    current = get_user_state(phone_number)  # Load existing state
-    current.update(updates)                 # Merge changes
-    current['phone_number'] = phone_number
-    if 'sender' not in current:
-        current['sender'] = phone_number
-    redis_client.setex(f"user_state:{phone_number}", 86400, json.dumps(current))
-
 
 def list_categories():
-    order_system = OrderSystem()
-    return "\n".join([f"{chr(65+i)}. {cat}" for i, cat in enumerate(order_system.list_categories())])
+    return "\n".join([f"{chr(65+i)}. {cat}" for i, cat in enumerate(current_catalog().list_categories())])
 
 def list_products(category_name):
-    order_system = OrderSystem()
-    products = order_system.list_products(category_name)
+    products = current_catalog().list_products(category_name)
     return "\n".join([f"{i+1}. {p.name} - R{p.price:.2f}" for i, p in enumerate(products)])
 
 def show_cart(user):
@@ -116,6 +158,34 @@ def show_cart(user):
     total = sum(p.price*q for p, q in cart)
     return "\n".join(lines) + f"\n\nTotal: R{total:.2f}"
 
+def category_index(user_data, catalog):
+    # The stored index only means something against the catalog version it was taken from
+    index = user_data.get('current_category_index')
+    if index is None or user_data.get('catalog_version') != catalog.version:
+        return None
+    if not 0 <= index < len(catalog.category_names):
+        return None
+    return index
+
+def page_index(user_data, catalog, category_index):
+    page = user_data.get('current_page_index', 0)
+    if not 0 <= page < catalog.page_count(catalog.category_names[category_index]):
+        return 0
+    return page
+
+def category_page_message(intro, catalog, category_index, page):
+    category = catalog.category_names[category_index]
+    pages = catalog.page_count(category)
+    heading = f"*{category}* (page {page + 1} of {pages})" if pages > 1 else f"*{category}*"
+    if page + 1 < pages:
+        footer = f"Type 'more' to see more from *{category}* or 'back' to go back."
+    else:
+        footer = (
+            f"If you're done shopping in the *{category}* category.\n"
+            "Type 'more' to see the next category or 'back' to see the previous one."
+        )
+    return f"{intro} products from {heading}:\n{catalog.page(category, page)}\n\n{footer}"
+
 def list_delivery_areas(areas):
     return "\n".join(
         [f"{i+1}. {area} - ${fee}" for i, (area, fee) in enumerate(areas.items())]
@@ -130,171 +200,193 @@ def handle_ask_name(prompt, user_data, phone_id):
 
 def handle_save_name(prompt, user_data, phone_id):
     user = User(prompt.title(), user_data['sender'])
-    order_system = OrderSystem()
-    categories_products = order_system.get_products_by_category()
-    category_names = list(categories_products.keys())
-    first_category = category_names[0]
-    first_products = categories_products[first_category]
+    catalog = current_catalog()
 
     update_user_state(user_data['sender'], {
         'step': 'choose_product',
         'user': user.to_dict(),
-        'category_names': category_names,
-        'current_category_index': 0
+        'catalog_version': catalog.version,
+        'current_category_index': 0,
+        'current_page_index': 0
     })
 
-    send(
-        f"Hie {user.payer_name}! Here are products from *{first_category}*:\n"
-        f"{first_products}\n\n"
-        f"If you're done shopping in the *{first_category}* category.\n"
-        "Type 'more' to see the next category.",
-        user_data['sender'], phone_id
-    )
+    send(category_page_message(f"Hie {user.payer_name}! Here are", catalog, 0, 0), user_data['sender'], phone_id)
 
 
     return {'step': 'choose_product', 'user': user.to_dict()}
 
 
-def reduce_stock(user):
-    for item in user.cart:
-        product = item["product"]
-        quantity = item["quantity"]
-        product.stock -= quantity
-        if product.stock <= 0:
-            product.active = False
-
-
-
-def admin_set_stock(product_name, stock_value):
-    for category in self.categories:
-        for product in self.categories[category]:
-            if product.name.lower() == product_name.lower():
-                product.stock = stock_value
-                product.active = stock_value > 0
-
-
 def handle_next_category(user_data, phone_id):
-    if 'category_names' not in user_data or 'current_category_index' not in user_data:
+    catalog = current_catalog()
+    current_index = category_index(user_data, catalog)
+    if current_index is None:
         send("Something went wrong. Please start again or type 'menu'.", user_data['sender'], phone_id)
         return {'step': 'choose_product'}
 
     user = User.from_dict(user_data['user'])
 
-    category_names = user_data['category_names']
-    current_index = user_data['current_category_index']
-    next_index = current_index + 1
+    category_names = catalog.category_names
+    current_page = page_index(user_data, catalog, current_index)
 
-    if next_index >= len(category_names):
+    # Finish the pages of this category before moving on to the next one
+    if current_page + 1 < catalog.page_count(category_names[current_index]):
+        next_index, next_page = current_index, current_page + 1
+    elif current_index + 1 < len(category_names):
+        next_index, next_page = current_index + 1, 0
+    else:
         send("No more categories. You can now select a product or type 'menu' to go back.",
              user_data['sender'], phone_id)
         return {
             'step': 'choose_product',
             'user': user.to_dict(),
-            'category_names': category_names,
-            'current_category_index': current_index
+            'catalog_version': catalog.version,
+            'current_category_index': current_index,
+            'current_page_index': current_page
         }
 
-    order_system = OrderSystem()
-    categories_products = order_system.get_products_by_category()
-    next_category = category_names[next_index]
-    next_products = categories_products.get(next_category, "No products found.")
-
     # Update user state in Redis
     update_user_state(user_data['sender'], {
         'step': 'choose_product',
         'user': user.to_dict(),
-        'category_names': category_names,
-        'current_category_index': next_index
+        'catalog_version': catalog.version,
+        'current_category_index': next_index,
+        'current_page_index': next_page
     })
 
-    send(
-        f"Here are products from *{next_category}*:\n"
-        f"{next_products}\n\n"
-        f"If you're done shopping in the *{next_category}* category.\n"
-        "Type 'more' to see the next category or 'back' to see the previous one.",
-        user_data['sender'], phone_id
-    )
+    send(category_page_message("Here are", catalog, next_index, next_page), user_data['sender'], phone_id)
 
 
     return {
         'step': 'choose_product',
         'user': user.to_dict(),
-        'category_names': category_names,
-        'current_category_index': next_index
+        'catalog_version': catalog.version,
+        'current_category_index': next_index,
+        'current_page_index': next_page
     }
 
 
 def handle_previous_category(user_data, phone_id):
-    if 'category_names' not in user_data or 'current_category_index' not in user_data:
+    catalog = current_catalog()
+    current_index = category_index(user_data, catalog)
+    if current_index is None:
         send("Something went wrong. Please type '4' to restart product browsing.", user_data['sender'], phone_id)
         return {'step': 'choose_product'}
 
     user = User.from_dict(user_data['user'])
-    category_names = user_data['category_names']
-    current_index = user_data['current_category_index']
-
-    # Prevent negative index
-    prev_index = max(current_index - 1, 0)
-
-    current_category = category_names[prev_index]
-    order_system = OrderSystem()
-    products_by_cat = order_system.get_products_by_category()
-    product_text = products_by_cat.get(current_category, "No products found.")
+    category_names = catalog.category_names
+    current_page = page_index(user_data, catalog, current_index)
+
+    # Step back through this category's pages, then to the last page of the previous one
+    if current_page > 0:
+        prev_index, prev_page = current_index, current_page - 1
+    elif current_index > 0:
+        prev_index = current_index - 1
+        prev_page = catalog.page_count(category_names[prev_index]) - 1
+    else:
+        prev_index, prev_page = 0, 0
 
     # Update state
     update_user_state(user_data['sender'], {
         'step': 'choose_product',
         'user': user.to_dict(),
-        'category_names': category_names,
-        'current_category_index': prev_index
+        'catalog_version': catalog.version,
+        'current_category_index': prev_index,
+        'current_page_index': prev_page
     })
 
-    send(
-        f"Here are products from *{current_category}*:\n"
-        f"{product_text}\n\n"
-        f"End of *{current_category}* category.\n"
-        "Type 'more' to see next category or 'back' to see previous one.",
-        user_data['sender'], phone_id
-    )
+    send(category_page_message("Here are", catalog, prev_index, prev_page), user_data['sender'], phone_id)
 
     return {
         'step': 'choose_product',
         'user': user.to_dict(),
-        'category_names': category_names,
-        'current_category_index': prev_index
+        'catalog_version': catalog.version,
+        'current_category_index': prev_index,
+        'current_page_index': prev_page
     }
 
 
+def select_product(product, user_data, phone_id):
+    if current_catalog().is_sold_out(product):
+        send(f"❌ Sorry, *{product.name}* is sold out. Please choose another product.", user_data['sender'], phone_id)
+        return {'step': user_data.get('step', 'choose_product')}
+
+    update_user_state(user_data['sender'], {
+        'selected_product': product.id,
+        'step': 'ask_quantity'
+    })
+    send(f"You selected {product.name}. How many would you like to add?", user_data['sender'], phone_id)
+    return {'step': 'ask_quantity', 'selected_product': product.id}
+
+
+def handle_search(query, user_data, phone_id):
+    query = query.strip()
+    results = current_catalog().search(query, SEARCH_RESULTS)
+    if not results:
+        send(
+            f"🔎 No products match *{query}*. Try another word, or type 'more' or 'back' to browse categories.",
+            user_data['sender'], phone_id
+        )
+        return {'step': user_data.get('step', 'choose_product')}
+
+    result_ids = [p.id for p in results]
+    update_user_state(user_data['sender'], {
+        'step': 'choose_search_result',
+        'search_results': result_ids
+    })
+    lines = "\n".join(f"{i}. {p.name} - ${p.price:.2f}" for i, p in enumerate(results, start=1))
+    send(
+        f"🔎 Products matching *{query}*:\n{lines}\n\n"
+        "Reply with a number to add it, search again, or type 'more' or 'back' to keep browsing.",
+        user_data['sender'], phone_id
+    )
+    return {'step': 'choose_search_result', 'search_results': result_ids}
+
+
+def handle_choose_search_result(prompt, user_data, phone_id):
+    text = prompt.strip()
+    if not text.isdigit():
+        return handle_choose_product(prompt, user_data, phone_id)
+
+    results = user_data.get('search_results') or []
+    index = int(text) - 1
+    product = current_catalog().get_product(results[index]) if 0 <= index < len(results) else None
+    if product is None:
+        send("Invalid product number. Try again.", user_data['sender'], phone_id)
+        return {'step': 'choose_search_result'}
+    return select_product(product, user_data, phone_id)
+
+
 def handle_choose_product(prompt, user_data, phone_id):
+    text = prompt.strip()
+    # Anything that isn't a product number is treated as a search
+    if text.lower().startswith("search "):
+        return handle_search(text[len("search "):], user_data, phone_id)
+    if not text.lstrip("-").isdigit():
+        return handle_search(text, user_data, phone_id)
+
     try:
         index = int(prompt) - 1
         if index < 0:
             raise ValueError
 
         # ✅ Get current category from state
-        category_names = user_data.get("category_names", [])
-        current_index = user_data.get("current_category_index", 0)
+        catalog = current_catalog()
+        current_index = category_index(user_data, catalog)
 
-        if not category_names or current_index >= len(category_names):
+        if current_index is None:
             send("Your session expired. Please type '4' to add an item again.", user_data['sender'], phone_id)
             return {'step': 'choose_product'}
 
-        current_category = category_names[current_index]
-        order_system = OrderSystem()
-        products = order_system.list_products(current_category)
+        current_category = catalog.category_names[current_index]
+        products = catalog.list_products(current_category)
 
         if index < len(products):
             selected_product = products[index]
             if not isinstance(selected_product, Product):
-                send(\"⚠️ Product data is invalid. Please type '4' to add an item again.\", user_data['sender'], phone_id)
+                send("⚠️ Product data is invalid. Please type '4' to add an item again.", user_data['sender'], phone_id)
                 return {'step': 'start'}
 
-            update_user_state(user_data['sender'], {
-                'selected_product': selected_product.__dict__,
-                'step': 'ask_quantity'
-            })
-            send(f"You selected {selected_product.name}. How many would you like to add?", user_data['sender'], phone_id)
-            return {'step': 'ask_quantity', 'selected_product': selected_product.__dict__}
+            return select_product(selected_product, user_data, phone_id)
         else:
             send("Invalid product number. Try again.", user_data['sender'], phone_id)
             return {'step': 'choose_product'}
@@ -311,17 +403,22 @@ def handle_ask_quantity(prompt, user_data, phone_id):
             raise ValueError
     except:
         send("Please enter a valid number for quantity (e.g., 1, 2, 3).", user_data['sender'], phone_id)
-        return {'step': 'ask_quantity', 'selected_product': user_data.get("selected_product", {})}
+        return {'step': 'ask_quantity', 'selected_product': user_data.get("selected_product")}
 
     user = User.from_dict(user_data['user'])
-    pd = user_data['selected_product']
+    pd = user_data.get('selected_product')
+    catalog = get_catalog()
+    if isinstance(pd, dict):
+        # Sessions written before selections were stored as product ids
+        product = catalog.find_product(pd.get('name', ''))
+    else:
+        product = catalog.get_product(pd)
 
     # ✅ Add safeguard here
-    if isinstance(pd, str):
+    if product is None:
         send("⚠️ Product data is corrupted. Please reselect the product.", user_data['sender'], phone_id)
         return {'step': 'start'}  # or whatever your initial step is
 
-    product = Product(pd['name'], pd['price'], pd.get('description', ''))
     user.add_to_cart(product, qty)
 
     update_user_state(user_data['sender'], {
@@ -396,32 +493,26 @@ def handle_post_add_menu(prompt, user_data, phone_id):
         }
 
     elif prompt.lower() in ["add", "add item", "add another", "add more", "4"]:
-        order_system = OrderSystem()
-        categories_products = order_system.get_products_by_category()
+        catalog = current_catalog()
         
         # 🧠 Try to continue from previous state
-        category_names = user_data.get("category_names") or list(categories_products.keys())
-        current_index = user_data.get("current_category_index", 0)
+        current_index = category_index(user_data, catalog)
         
         # Prevent out-of-range errors
-        if current_index >= len(category_names):
+        if current_index is None:
             current_index = 0
-        
-        current_category = category_names[current_index]
-        first_products = categories_products.get(current_category, "No products found.")
+        current_page = page_index(user_data, catalog, current_index)
 
         update_user_state(user_data['sender'], {
             'step': 'choose_product',
             'user': user.to_dict(),
-            'category_names': category_names,
-            'current_category_index': current_index
+            'catalog_version': catalog.version,
+            'current_category_index': current_index,
+            'current_page_index': current_page
         })
     
         send(
-            f"Sure! Here are products from *{current_category}*:\n"
-            f"{first_products}\n\n"
-            f"If you're done shopping in the *{current_category}* category.\n"
-            "Type 'more' to see the next category or 'back' to see the previous one.",
+            category_page_message("Sure! Here are", catalog, current_index, current_page),
             user_data['sender'],
             phone_id
         )
@@ -501,8 +592,8 @@ def handle_await_remove_quantity(prompt, user_data, phone_id):
 
 def handle_get_area(prompt, user_data, phone_id):
     user = User.from_dict(user_data['user'])
-    delivery_areas = user_data['delivery_areas']
-    area_names = user_data.get("area_names", list(delivery_areas.keys()))  # fallback if not stored
+    delivery_areas = DELIVERY_AREAS
+    area_names = list(delivery_areas.keys())
     area = prompt.strip().title()
 
     # Check if input is a number
@@ -514,8 +605,6 @@ def handle_get_area(prompt, user_data, phone_id):
             send(f"❌ Invalid number. Please choose from:\n{list_delivery_areas(delivery_areas)}", user_data['sender'], phone_id)
             return {
                 'step': 'get_area',
-                'delivery_areas': delivery_areas,
-                'area_names': area_names,
                 'user': user.to_dict()
             }
 
@@ -544,8 +633,6 @@ def handle_get_area(prompt, user_data, phone_id):
         send(f"❌ Invalid area. Please choose from:\n{list_delivery_areas(delivery_areas)}", user_data['sender'], phone_id)
         return {
             'step': 'get_area',
-            'delivery_areas': delivery_areas,
-            'area_names': area_names,
             'user': user.to_dict()
         }
 
@@ -568,34 +655,16 @@ def handle_choose_delivery_or_pickup(prompt, user_data, phone_id):
         }
 
     elif choice in ['1', 'delivery', 'deliver']:
-        delivery_areas = {
-            "Harare": 240,
-            "Chitungwiza": 300,
-            "Mabvuku": 300,
-            "Ruwa": 300,
-            "Domboshava": 250,
-            "Southlea": 300,
-            "Southview": 300,
-            "Epworth": 300,
-            "Mazoe": 300,
-            "Chinhoyi": 350,
-            "Banket": 350,
-            "Rusape": 400,
-            "Dema": 300
-        }
+        delivery_areas = DELIVERY_AREAS
 
         if not delivery_areas:
             logging.error("delivery_areas is empty or None.")
             send("Delivery options are currently unavailable. Please try again later.", user_data['sender'], phone_id)
             return {'step': 'choose_delivery_or_pickup', 'user': user.to_dict()}
 
-        area_names = list(delivery_areas.keys())
-
         update_user_state(user_data['sender'], {
             'user': user.to_dict(),
-            'step': 'get_area',
-            'delivery_areas': delivery_areas,
-            'area_names': area_names
+            'step': 'get_area'
         })
 
         send("Please select your delivery area by number:\n" + list_delivery_areas(delivery_areas), user_data['sender'], phone_id)
@@ -820,7 +889,6 @@ def handle_confirm_details(prompt, user_data, phone_id):
 
 def handle_payment_selection(selection, user_data, phone_id):
     user = User.from_dict(user_data['user'])
-    order_id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
     sender = user_data['sender']  # Get sender from user_data
 
     # Map selection to payment method
@@ -828,7 +896,7 @@ def handle_payment_selection(selection, user_data, phone_id):
         "1": (
             "EFT\nBank: FNB\nName: Zimbogrocer (Pty) Ltd\n"
             "Account: 62847698167\nBranch Code: 250655\n"
-            "Swift Code: FIRNZAJJ\nReference: " + order_id
+            "Swift Code: FIRNZAJJ\nReference: {order_id}"
         ),
         "2": "Pay at SHOPRITE/CHECKERS/USAVE/PICK N PAY/ GAME/ MAKRO/ SPAR using Mukuru wicode",
         "3": "World Remit Transfer",
@@ -838,21 +906,53 @@ def handle_payment_selection(selection, user_data, phone_id):
 
     payment_text = payment_methods.get(selection)
     if payment_text:
-        # Save order to Redis
-        order_data = {
-            'order_id': order_id,
-            'user_data': user.to_dict(),
-            'timestamp': datetime.now().isoformat(),
-            'status': 'pending',
-            'total_amount': user.get_cart_total(),
-            'payment_method': payment_text
-        }
-        
-        # Store order in Redis with expiration (7 days)
-        redis_client.setex(f"order:{order_id}", 604800, json.dumps(order_data))
-        
-        # Also store order ID in user's order list
-        redis_client.lpush(f"user_orders:{sender}", order_id)
+        out_of_stock = reserve_stock(user.get_cart_contents())
+        if out_of_stock:
+            send(
+                f"❌ Sorry, *{out_of_stock}* has just sold out. Please remove it from your cart and try again.\n"
+                "What would you like to do next?\n1 View Groceries Selected\n2 Remove Groceries Selected\n3 Remove Item\n4 Add Item",
+                sender, phone_id
+            )
+            update_user_state(sender, {
+                'user': user.to_dict(),
+                'step': 'post_add_menu'
+            })
+            return {
+                'step': 'post_add_menu',
+                'user': user.to_dict()
+            }
+
+        try:
+            order_id = allocate_order_id()
+            payment_text = payment_text.format(order_id=order_id)
+
+            # Save order to Redis
+            order_data = {
+                'order_id': order_id,
+                'user_data': user.to_dict(),
+                # Cart lines spelled out so the order doesn't depend on the catalog later
+                'items': [
+                    {'name': p.name, 'price': p.price, 'quantity': q}
+                    for p, q in user.get_cart_contents()
+                ],
+                'timestamp': business_now().isoformat(),
+                'status': 'pending',
+                'total_amount': user.get_cart_total(),
+                'payment_method': payment_text
+            }
+
+            # Order, the user's order list and the time/status indexes in one transaction
+            commit_order(order_id, sender, order_data)
+        except Exception as e:
+            # No order was written: put the stock back so a retry doesn't take it twice
+            logging.error(f"❌ Could not place order for {mask_phone(sender)}: {e}", exc_info=True)
+            release_stock(user.get_cart_contents())
+            send("❌ Sorry, we couldn't place your order just now. Please send your payment option again.", sender, phone_id)
+            return {
+                'step': 'await_payment_selection',
+                'user': user.to_dict()
+            }
+        count_order(selection)
     
         # Notify owner
         owner_message = (
@@ -909,25 +1009,16 @@ def handle_payment_selection(selection, user_data, phone_id):
 def handle_ask_place_another_order(prompt, user_data, phone_id):
     if prompt.lower() in ["yes", "y", "1"]:
         user = User(prompt.title(), user_data['sender'])
-        order_system = OrderSystem()
-        categories_products = order_system.get_products_by_category()
-        category_names = list(categories_products.keys())
-        first_category = category_names[0]
-        first_products = categories_products[first_category]
+        catalog = current_catalog()
     
         update_user_state(user_data['sender'], {
             'step': 'choose_product',
             'user': user.to_dict(),
-            'category_names': category_names,
-            'current_category_index': 0
+            'catalog_version': catalog.version,
+            'current_category_index': 0,
+            'current_page_index': 0
         })
-        send(
-            f"Alright! Here are products from *{first_category}*:\n"
-            f"{first_products}\n\n"
-            f"If you're done shopping in the *{first_category}* category.\n"
-            "Type 'more' to see the next category.",
-            user_data['sender'], phone_id
-        )
+        send(category_page_message("Alright! Here are", catalog, 0, 0), user_data['sender'], phone_id)
         return {'step': 'choose_product'}
     else:
         payment_option = user_data.get("selected_payment_method")
@@ -956,12 +1047,10 @@ def handle_default(prompt, user_data, phone_id):
 
 
 def list_categories():
-    order_system = OrderSystem()
-    return "\n".join([f"{chr(65+i)}. {cat}" for i, cat in enumerate(order_system.list_categories())])
+    return "\n".join([f"{chr(65+i)}. {cat}" for i, cat in enumerate(current_catalog().list_categories())])
 
 def list_products(category_name):
-    order_system = OrderSystem()
-    products = order_system.list_products(category_name)
+    products = current_catalog().list_products(category_name)
     return "\n".join([f"{i+1}. {p.name} - R{p.price:.2f}" for i, p in enumerate(products)])
 
 def show_cart(user):
@@ -973,20 +1062,103 @@ def show_cart(user):
     return "\n".join(lines) + f"\n\nTotal: R{total:.2f}"
 
 
+def bounded(message):
+    if len(message) <= MAX_REPLY_CHARS:
+        return message
+    return message[:MAX_REPLY_CHARS - 1] + "…"
+
+
+def order_summary_line(order):
+    placed = order.get('timestamp', '')[11:16]
+    name = order.get('user_data', {}).get('payer_name', '')
+    return f"#{order['order_id']} {placed} {order.get('status', 'pending')} R{order.get('total_amount', 0):.2f} {name}"
+
+
+def order_list_message(title, total, orders, page, command):
+    pages = max(1, -(-total // ADMIN_ORDERS_PAGE_SIZE))
+    if not orders:
+        return f"📋 {title}: none." if page == 1 else f"📋 {title}: no page {page} (there are {pages})."
+    message = f"📋 {title} ({total}) - page {page}/{pages}\n" + "\n".join(order_summary_line(o) for o in orders)
+    if page < pages:
+        message += f"\n\nSend '{command} {page + 1}' for more."
+    return bounded(message)
+
+
+def order_detail_message(order):
+    user_data = order.get('user_data', {})
+    checkout = user_data.get('checkout_data', {})
+    items = "\n".join(f"{i['name']} x{i['quantity']} = R{i['price'] * i['quantity']:.2f}" for i in order.get('items', []))
+    return bounded(
+        f"🧾 Order #{order['order_id']} ({order.get('status', 'pending')})\n"
+        f"Placed: {order.get('timestamp', '')[:16].replace('T', ' ')}\n"
+        f"From: {user_data.get('payer_name', '')} ({user_data.get('payer_phone', '')})\n"
+        f"Receiver: {checkout.get('receiver_name', 'N/A')}\n"
+        f"ID: {checkout.get('receiver_id', 'N/A')}\n"
+        f"Address: {checkout.get('address', 'N/A')}\n"
+        f"Phone: {checkout.get('phone', 'N/A')}\n"
+        f"Payment: {order.get('payment_method', '').splitlines()[0] if order.get('payment_method') else 'N/A'}\n\n"
+        f"{items}\n\nTotal: R{order.get('total_amount', 0):.2f}"
+    )
+
+
+def my_orders_message(sender):
+    history = user_order_history(sender, MY_ORDERS_SHOWN)
+    if not history:
+        return "You have no orders from the last 7 days."
+    lines = [
+        f"#{order_id} {summary['placed']} - {summary['status']} - R{summary['total']:.2f}"
+        for order_id, summary in history
+    ]
+    return "🧾 Your recent orders:\n" + "\n".join(lines)
+
+
+def handle_admin_order_command(text, sender, phone_id):
+    """Answer 'orders today|pending [page]', 'order <id>', 'paid <id>' and 'delivered <id>'.
+
+    Returns False when text isn't one of these commands.
+    """
+    parts = text.split()
+    if len(parts) in (2, 3) and parts[0] == "orders" and parts[1] in ("today", "pending"):
+        if len(parts) == 3 and not parts[2].isdigit():
+            send(f"❌ Usage: orders {parts[1]} [page]", sender, phone_id)
+            return True
+        page = max(1, int(parts[2])) if len(parts) == 3 else 1
+        offset = (page - 1) * ADMIN_ORDERS_PAGE_SIZE
+        if parts[1] == "today":
+            total, orders = orders_since(start_of_business_day(), offset, ADMIN_ORDERS_PAGE_SIZE)
+            title = "Today's orders"
+        else:
+            total, orders = orders_with_status("pending", offset, ADMIN_ORDERS_PAGE_SIZE)
+            title = "Pending orders"
+        send(order_list_message(title, total, orders, page, f"orders {parts[1]}"), sender, phone_id)
+        return True
+
+    if len(parts) == 2 and parts[0] in ("order", "paid", "delivered"):
+        order_id = parts[1].lstrip("#").upper()
+        if parts[0] == "order":
+            order = get_order(order_id)
+        else:
+            order = set_order_status(order_id, parts[0])
+        if order is None:
+            send(f"❌ Order #{order_id} not found. Orders are kept for 7 days.", sender, phone_id)
+        elif parts[0] == "order":
+            send(order_detail_message(order), sender, phone_id)
+        else:
+            send(f"✅ Order #{order_id} marked as {parts[0]}.", sender, phone_id)
+        return True
+
+    return False
+
+
 def send(answer, sender, phone_id):
     if not sender or not isinstance(sender, str) or not sender.isdigit():
-        logging.error(f"❌ Invalid sender: {sender}")
+        logging.error(f"❌ Invalid sender: {mask_phone(sender)}")
         return
 
     if not answer or not isinstance(answer, str) or not answer.strip():
         logging.error("❌ Message body is empty or invalid.")
         return
 
-    url = f"https://graph.facebook.com/v19.0/{phone_id}/messages"
-    headers = {
-        'Authorization': f'Bearer {wa_token}',
-        'Content-Type': 'application/json'
-    }
     data = {
         "messaging_product": "whatsapp",
         "to": sender,
@@ -994,16 +1166,28 @@ def send(answer, sender, phone_id):
         "text": {"body": answer}
     }
 
-    logging.info(f"📤 Sending message to {sender}: {json.dumps(data)}")
+    dispatch(sender, deliver, data, phone_id)
+
 
+def deliver(data, phone_id):
+    import requests
+
+    if not wait_for_send_slot(phone_id):
+        logging.error("❌ Dropping message: no send slot within the wait limit", extra={"to": mask_phone(data["to"])})
+        return
+    started = time.perf_counter()
     try:
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        logging.info(f"✅ Message sent successfully: {response.text}")
+        response = post_message(phone_id, wa_token, data)
+        observe_send(response.status_code, time.perf_counter() - started)
+        log_payload("📤 Message sent", data, status=response.status_code)
     except requests.exceptions.RequestException as e:
-        logging.error(f"❌ Failed to send message: {e}")
-        if e.response is not None:
-            logging.error(f"❗ Response content: {e.response.text}")
+        status = e.response.status_code if e.response is not None else "error"
+        observe_send(status, time.perf_counter() - started)
+        logging.error(f"❌ Failed to send message: {e}", extra={
+            "to": mask_phone(data["to"]),
+            "status": status,
+            "response": e.response.text[:500] if e.response is not None else None,
+        })
 
 
 # Action mapping
@@ -1011,6 +1195,7 @@ action_mapping = {
     "ask_name": handle_ask_name,
     "save_name": handle_save_name,
     "choose_product": handle_choose_product,
+    "choose_search_result": handle_choose_search_result,
     "ask_quantity": handle_ask_quantity,
     "post_add_menu": handle_post_add_menu,
     "get_area": handle_get_area,
@@ -1027,38 +1212,67 @@ action_mapping = {
     "ask_place_another_order": handle_ask_place_another_order,
     "choose_delivery_or_pickup": handle_choose_delivery_or_pickup,
     "get_receiver_name_pickup": handle_get_receiver_name_pickup,
+    "get_phone_pickup": handle_get_phone_pickup,
     "get_id_pickup": handle_get_id_pickup,
 }
 
 def get_action(current_state, prompt, user_data, phone_id):
     handler = action_mapping.get(current_state, handle_default)
-    return handler(prompt, user_data, phone_id)
+    started = time.perf_counter()
+    try:
+        return handler(prompt, user_data, phone_id)
+    finally:
+        observe_handler(current_state if handler is not handle_default else "unknown", time.perf_counter() - started)
 
 # Message handler
 def message_handler(prompt, sender, phone_id):
+    # Handlers read and update state through one session: a single GET up front
+    # and at most one SETEX when the message is done. Their sends go out
+    # concurrently and are all finished before this returns.
+    with outbound_batch(), user_session(sender):
+        dispatch_message(prompt, sender, phone_id)
+
+
+def save_state(sender, updated_state):
+    # A handler that didn't recognise the reply returns nothing; stay on its step
+    if updated_state is None:
+        logging.warning(f"⚠️ No state change for {mask_phone(sender)}, keeping the current step")
+        return
+    update_user_state(sender, updated_state)
+
+
+def dispatch_message(prompt, sender, phone_id):
     text = prompt.strip().lower()
 
     if text in ["hi", "hey", "hie"]:
         user_state = {'step': 'ask_name', 'sender': sender}
         updated_state = get_action('ask_name', prompt, user_state, phone_id)
-        update_user_state(sender, updated_state)
+        save_state(sender, updated_state)
         return
 
     user_state = get_user_state(sender)
     user_state['sender'] = sender
 
-    if text == "more" and user_state.get('step') == 'choose_product':
+    if text == "more" and user_state.get('step') in BROWSING_STEPS:
         updated_state = handle_next_category(user_state, phone_id)
-        update_user_state(sender, updated_state)
+        save_state(sender, updated_state)
         return
         
 
-    if text == "back" and user_state.get('step') == 'choose_product':
+    if text == "back" and user_state.get('step') in BROWSING_STEPS:
         updated_state = handle_previous_category(user_state, phone_id)
-        update_user_state(sender, updated_state)
+        save_state(sender, updated_state)
         return
 
 
+    if text == "my orders":
+        send(my_orders_message(sender), sender, phone_id)
+        return
+
+    # ✅ Admin order lookups and status changes
+    if sender in ADMIN_NUMBERS and handle_admin_order_command(text, sender, phone_id):
+        return
+
     # ✅ Admin stock control
     if sender in ADMIN_NUMBERS and prompt.lower().startswith("stock "):
         try:
@@ -1070,8 +1284,7 @@ def message_handler(prompt, sender, phone_id):
             product_name = " ".join(parts[1:-1])
             new_stock = int(stock_str)
     
-            order_system = OrderSystem()
-            result = order_system.set_stock(product_name, new_stock)
+            result = set_stock(product_name, new_stock)
             send(result, sender, phone_id)
         except ValueError:
             send("❌ Usage: stock <product_name> <new_stock>\nExample: stock rice 12", sender, phone_id)
@@ -1081,32 +1294,23 @@ def message_handler(prompt, sender, phone_id):
 
     if user_state.get("step") == "cart_next_action":
         if text == "1":
-            order_system = OrderSystem()
-            categories_products = order_system.get_products_by_category()
-            category_names = user_state.get("category_names") or list(categories_products.keys())
-            current_index = user_state.get("current_category_index", 0)
+            catalog = current_catalog()
+            current_index = category_index(user_state, catalog)
     
-            if current_index >= len(category_names):
+            if current_index is None:
                 current_index = 0
-    
-            current_category = category_names[current_index]
-            first_products = categories_products.get(current_category, "No products found.")
+            current_page = page_index(user_state, catalog, current_index)
             user = User.from_dict(user_state['user'])
     
             update_user_state(sender, {
                 'step': 'choose_product',
                 'user': user.to_dict(),
-                'category_names': category_names,
-                'current_category_index': current_index
+                'catalog_version': catalog.version,
+                'current_category_index': current_index,
+                'current_page_index': current_page
             })
     
-            send(
-                f"Sure! Here are products from *{current_category}*:\n"
-                f"{first_products}\n\n"
-                f"End of *{current_category}* category.\n"
-                "Type 'more' to see the next category or 'back' to see previous one.",
-                sender, phone_id
-            )
+            send(category_page_message("Sure! Here are", catalog, current_index, current_page), sender, phone_id)
             return
     
         elif text == "2":
@@ -1128,18 +1332,79 @@ def message_handler(prompt, sender, phone_id):
     # ✅ Safe fallback
     step = user_state.get('step') or 'ask_name'
     updated_state = get_action(step, prompt, user_state, phone_id)
-    update_user_state(sender, updated_state)
+    save_state(sender, updated_state)
+
+
+def handle_message(sender, prompt, phone_id):
+    if prompt is None:
+        send("Please send a text message", sender, phone_id)
+    else:
+        message_handler(prompt, sender, phone_id)
+
+
+# Failures that leave the conversation where it was (no lease, the state
+# couldn't be loaded, or another write got in first and ours was dropped), so
+# the message is run again when WhatsApp redelivers it
+UNHANDLED_MESSAGE_ERRORS = (LeaseTimeout, SessionConflict, SessionUnavailable)
+
+
+def process_message(sender, prompt, phone_id):
+    with sender_lease(sender):
+        handle_message(sender, prompt, phone_id)
+
+
+def process_sender_messages(sender, messages):
+    """Run one sender's messages back-to-back, in the order they were delivered.
+
+    Returns False if any of them failed before it was handled; those are
+    released for redelivery.
+    """
+    ok = True
+    for prompt, phone_id, message_id in messages:
+        try:
+            process_message(sender, prompt, phone_id)
+        except UNHANDLED_MESSAGE_ERRORS as e:
+            logging.error(f"❌ Message {message_id} from {mask_phone(sender)} was not handled: {e}")
+            release_message_id(message_id)
+            ok = False
+        except Exception as e:
+            # The handler may already have placed an order or replied; a
+            # redelivery would do that again, so the message stays claimed
+            logging.error(f"Error processing message from {mask_phone(sender)}: {e}", exc_info=True)
+    return ok
+
+
+def iter_webhook_messages(data):
+    """Yield (phone_id, message) for every message in every entry and change of a payload."""
+    for entry in data.get("entry", []):
+        for change in entry.get("changes", []):
+            value = change.get("value", {})
+            phone_id = value.get("metadata", {}).get("phone_number_id")
+            for message in value.get("messages", []):
+                yield phone_id, message
     
 
 # Flask app
 app = Flask(__name__)
+webhook_pool = ThreadPoolExecutor(max_workers=webhook_threads)
 
 @app.route("/", methods=["GET"])
 def index():
     return render_template("connected.html")
 
+@app.route("/outbound", methods=["GET"])
+def outbound_status():
+    # Send token bucket fill and queued sends; a non-zero queue means we are throttled
+    return jsonify(bucket_status(request.args.get("phone_id", phone_id)))
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    body, content_type = render_metrics()
+    return body, 200, {"Content-Type": content_type}
+
 @app.route("/webhook", methods=["GET", "POST"])
 def webhook():
+    count_webhook_request(request.method)
     if request.method == "GET":
         mode = request.args.get("hub.mode")
         token = request.args.get("hub.verify_token")
@@ -1150,27 +1415,54 @@ def webhook():
 
     elif request.method == "POST":
         data = request.get_json()
-        logging.info(f"Incoming webhook data: {data}")
-
-        try:
-            entry = data["entry"][0]
-            changes = entry["changes"][0]
-            value = changes["value"]
-            phone_id = value["metadata"]["phone_number_id"]
-
-            messages = value.get("messages", [])
-            if messages:
-                message = messages[0]
+        log_payload("📥 Incoming webhook", data)
+
+        # Each message is claimed, then queued or collected on its own, so
+        # one failure doesn't cost the rest of the batch
+        ok = True
+        by_sender = {}
+        for phone_id, message in iter_webhook_messages(data):
+            message_id = message.get("id")
+            try:
                 sender = message["from"]
+                prompt = message["text"]["body"].strip() if "text" in message else None
+            except (KeyError, TypeError, AttributeError) as e:
+                logging.error(f"❌ Skipping malformed message {message_id}: {e}")
+                count_webhook_message("malformed")
+                continue
 
-                if "text" in message:
-                    prompt = message["text"]["body"].strip()
-                    message_handler(prompt, sender, phone_id)
+            claimed = False
+            try:
+                claimed = claim_message_id(message_id)
+                if not claimed:
+                    logging.info(f"🔁 Skipping redelivered message {message_id} from {mask_phone(sender)}")
+                    count_webhook_message("duplicate")
+                elif inbound_mode == "queue":
+                    enqueue_message(sender, prompt, phone_id)
+                    count_webhook_message("queued")
                 else:
-                    send("Please send a text message", sender, phone_id)
-        except Exception as e:
-            logging.error(f"Error processing webhook: {e}", exc_info=True)
-
+                    by_sender.setdefault(sender, []).append((prompt, phone_id, message_id))
+                    count_webhook_message("inline")
+            except Exception as e:
+                logging.error(f"❌ Could not take message {message_id} from {mask_phone(sender)}: {e}", exc_info=True)
+                if claimed:
+                    release_message_id(message_id)
+                count_webhook_message("failed")
+                ok = False
+
+        if len(by_sender) == 1:
+            ok = process_sender_messages(*next(iter(by_sender.items()))) and ok
+        elif by_sender:
+            futures = [
+                webhook_pool.submit(process_sender_messages, sender, messages)
+                for sender, messages in by_sender.items()
+            ]
+            wait(futures)
+            ok = all(future.result() for future in futures) and ok
+
+        # A non-200 makes WhatsApp redeliver; the messages already handled are skipped as duplicates
+        if not ok:
+            return jsonify({"status": "error"}), 500
         return jsonify({"status": "ok"}), 200
 
 if __name__ == "__main__":
@@ -0,0 +1,97 @@
+import os
+import json
+import logging
+from db import redis_client
+
+# When INBOUND_MODE=queue the webhook appends each message to its sender's
+# inbox:{sender} list and adds an entry naming the sender to this stream.
+# A worker that reads the entry handles that sender's inbox oldest first
+# while holding their lease, so a sender's messages run in the order they
+# arrived whichever worker picks them up.
+STREAM_KEY = os.environ.get("INBOUND_STREAM", "inbound_messages")
+GROUP = "message_workers"
+
+# Keep roughly this many entries; acknowledged ones are no longer needed
+STREAM_MAXLEN = 100000
+
+# Entries left unacknowledged this long (their consumer died) are taken over
+CLAIM_IDLE_MS = 60000
+
+# WhatsApp retries deliveries for well under a day; remember ids that long
+SEEN_MESSAGE_TTL = 86400
+
+# An inbox nobody has drained for this long is dropped
+INBOX_TTL = 86400
+
+
+def claim_message_id(message_id):
+    """Return True the first time a WhatsApp message id is seen, False for redeliveries."""
+    if not message_id:
+        return True
+    return bool(redis_client.set(f"seen_message:{message_id}", 1, nx=True, ex=SEEN_MESSAGE_TTL))
+
+
+def release_message_id(message_id):
+    """Forget a claimed id whose message wasn't handled, so its redelivery is."""
+    if not message_id:
+        return
+    try:
+        redis_client.delete(f"seen_message:{message_id}")
+    except Exception as e:
+        logging.error(f"❌ Could not release message id {message_id}: {e}")
+
+
+def inbox_key(sender):
+    return f"inbox:{sender}"
+
+
+def push_inbox(pipe, sender, prompt, phone_id):
+    pipe.rpush(inbox_key(sender), json.dumps([prompt, phone_id]))
+    pipe.expire(inbox_key(sender), INBOX_TTL)
+
+
+def enqueue_message(sender, prompt, phone_id):
+    """Queue one inbound message behind the sender's earlier ones. ``prompt`` is None for non-text messages."""
+    pipe = redis_client.pipeline()
+    push_inbox(pipe, sender, prompt, phone_id)
+    pipe.xadd(STREAM_KEY, {"sender": sender}, maxlen=STREAM_MAXLEN, approximate=True)
+    return pipe.execute()[-1]
+
+
+def peek_inbox(sender):
+    """The sender's oldest queued (prompt, phone_id), or None when the inbox is empty."""
+    message = redis_client.lindex(inbox_key(sender), 0)
+    return tuple(json.loads(message)) if message else None
+
+
+def pop_inbox(sender):
+    redis_client.lpop(inbox_key(sender))
+
+
+def ensure_group(stream=STREAM_KEY, group=GROUP):
+    try:
+        redis_client.xgroup_create(stream, group, id="0", mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def read_messages(consumer, count=10, block_ms=5000, stream=STREAM_KEY, group=GROUP):
+    """Return [(entry_id, fields)] for this consumer: stale entries first, then new ones."""
+    claimed = redis_client.xautoclaim(stream, group, consumer, CLAIM_IDLE_MS, "0-0", count=count)
+    entries = [entry for entry in claimed[1] if entry[1]]
+    if entries:
+        logging.info(f"♻️ {consumer} reclaimed {len(entries)} stale entries from {stream}")
+        return entries
+
+    response = redis_client.xreadgroup(group, consumer, {stream: ">"}, count=count, block=block_ms)
+    if not response:
+        return []
+    return response[0][1]
+
+
+def ack_messages(entry_ids, stream=STREAM_KEY, group=GROUP):
+    pipe = redis_client.pipeline()
+    pipe.xack(stream, group, *entry_ids)
+    pipe.xdel(stream, *entry_ids)
+    pipe.execute()
@@ -0,0 +1,144 @@
+"""Prometheus metrics, served at /metrics.
+
+When the app runs as several processes (gunicorn workers, worker.py) point
+PROMETHEUS_MULTIPROC_DIR at a directory they all share and clear it on
+deploy. Every process then writes its samples there, and /metrics in any of
+them reports the totals. prometheus_client is only imported the first time a
+metric is recorded, which keeps it off the cold-start path.
+"""
+import logging
+import os
+import threading
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+HANDLER_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+REDIS_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1)
+SEND_BUCKETS = (.05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+
+_metrics = None
+_lock = threading.Lock()
+
+
+class ActiveSessionsCollector:
+    """Reads the active session count from Redis at scrape time."""
+
+    def family(self, **kwargs):
+        from prometheus_client.core import GaugeMetricFamily
+        from session import ACTIVE_SESSION_WINDOW
+        return GaugeMetricFamily(
+            "zimbogrocer_active_sessions",
+            f"Customers whose conversation state changed in the last {ACTIVE_SESSION_WINDOW}s",
+            **kwargs
+        )
+
+    def describe(self):
+        # Lets the registry learn the name without querying Redis
+        yield self.family()
+
+    def collect(self):
+        from session import active_session_count
+        try:
+            count = active_session_count()
+        except Exception as e:
+            logging.error(f"❌ Could not count active sessions: {e}")
+            return
+        yield self.family(value=count)
+
+
+class Metrics:
+    def __init__(self):
+        from prometheus_client import Counter, Histogram, REGISTRY, disable_created_metrics
+
+        # The *_created timestamp series only add scrape size
+        disable_created_metrics()
+        self.handler_seconds = Histogram(
+            "zimbogrocer_handler_seconds", "Time to handle one message, by conversation step",
+            ["step"], buckets=HANDLER_BUCKETS)
+        self.redis_seconds = Histogram(
+            "zimbogrocer_redis_command_seconds", "Redis command latency, by command",
+            ["command"], buckets=REDIS_BUCKETS)
+        self.redis_errors = Counter(
+            "zimbogrocer_redis_errors", "Redis commands that raised, by command and error",
+            ["command", "error"])
+        self.send_seconds = Histogram(
+            "zimbogrocer_send_seconds", "Graph API send latency including retries",
+            buckets=SEND_BUCKETS)
+        self.sends = Counter(
+            "zimbogrocer_sends", "Graph API sends, by HTTP status", ["status"])
+        self.webhook_requests = Counter(
+            "zimbogrocer_webhook_requests", "Webhook requests, by method", ["method"])
+        self.webhook_messages = Counter(
+            "zimbogrocer_webhook_messages", "Messages received by the webhook, by outcome", ["outcome"])
+        self.orders = Counter(
+            "zimbogrocer_orders_created", "Orders placed, by payment option", ["payment"])
+
+        self.children = {}
+
+        if not MULTIPROC_DIR:
+            REGISTRY.register(ActiveSessionsCollector())
+
+    def labelled(self, metric, *labels):
+        # .labels() costs about as much as the observation; reuse the children
+        key = (id(metric),) + labels
+        child = self.children.get(key)
+        if child is None:
+            child = self.children.setdefault(key, metric.labels(*labels))
+        return child
+
+
+def get_metrics():
+    global _metrics
+    if _metrics is None:
+        with _lock:
+            if _metrics is None:
+                _metrics = Metrics()
+    return _metrics
+
+
+def observe_handler(step, seconds):
+    metrics = get_metrics()
+    metrics.labelled(metrics.handler_seconds, step).observe(seconds)
+
+
+def observe_redis(command, seconds, error=None):
+    metrics = get_metrics()
+    metrics.labelled(metrics.redis_seconds, command).observe(seconds)
+    if error is not None:
+        metrics.labelled(metrics.redis_errors, command, type(error).__name__).inc()
+
+
+def observe_send(status, seconds):
+    metrics = get_metrics()
+    metrics.send_seconds.observe(seconds)
+    metrics.labelled(metrics.sends, str(status)).inc()
+
+
+def count_webhook_request(method):
+    metrics = get_metrics()
+    metrics.labelled(metrics.webhook_requests, method).inc()
+
+
+def count_webhook_message(outcome):
+    metrics = get_metrics()
+    metrics.labelled(metrics.webhook_messages, outcome).inc()
+
+
+def count_order(payment):
+    metrics = get_metrics()
+    metrics.labelled(metrics.orders, payment).inc()
+
+
+def render():
+    """Current metrics in the Prometheus text format, with its content type."""
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+
+    get_metrics()
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(ActiveSessionsCollector())
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
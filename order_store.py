@@ -0,0 +1,256 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from db import redis_client
+
+# Order days follow the shop's clock (Harare, UTC+2, no daylight saving)
+BUSINESS_TZ = timezone(timedelta(hours=float(os.environ.get("BUSINESS_UTC_OFFSET_HOURS", 2))))
+
+ORDER_TTL = 604800
+
+ORDER_STATUSES = ("pending", "paid", "delivered")
+
+# Sorted sets of order id -> creation time: every order, and one per status.
+# Entries older than ORDER_TTL point at expired orders and are trimmed on commit.
+ORDERS_BY_TIME_KEY = "orders_by_time"
+
+# Retries for a status change that lost a WATCH race against another worker
+STATUS_UPDATE_RETRIES = 10
+
+# Each customer keeps their latest order ids in user_orders:{sender} and a
+# short summary of each in user_order_summaries:{sender}, so 'my orders'
+# needs neither the order blobs nor an unbounded list. Both keys expire with
+# the customer's newest order.
+USER_ORDER_HISTORY = int(os.environ.get("USER_ORDER_HISTORY", 20))
+
+# With ARCHIVE_STREAM set (e.g. order_archive), every committed order and
+# status change is also appended there for archiver.py to copy into SQL.
+# Unset, nothing is archived. Acknowledged entries are deleted; the cap bounds
+# the memory held while no archiver is draining the stream.
+ARCHIVE_STREAM_KEY = os.environ.get("ARCHIVE_STREAM") or None
+ARCHIVE_STREAM_MAXLEN = int(os.environ.get("ARCHIVE_STREAM_MAXLEN", 20000))
+
+# Kept a little past midnight so a late allocation never restarts the day's count
+ORDER_SEQ_TTL = 2 * 86400
+
+# Order ids are the shop day followed by that day's sequence number, e.g.
+# 2610170042: short and all digits for an EFT reference, and they sort by
+# creation time when compared as numbers. The per-day counter is shared by
+# every worker; ids that already exist (a counter lost in a Redis restart)
+# are skipped.
+
+# Writes the order, the customer's capped history and summary, and the time
+# and status indexes in one atomic step, trimming index entries that point at
+# expired orders.
+# KEYS: order, user_orders, user_order_summaries, orders_by_time, status index, every status index[, archive stream]
+# ARGV: order id, order json, ttl, created, expired before, summary json, history cap, archive cap ('' to not archive)
+COMMIT_SCRIPT = """
+local order_id = ARGV[1]
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+redis.call('LPUSH', KEYS[2], order_id)
+redis.call('HSET', KEYS[3], order_id, ARGV[6])
+local dropped = redis.call('LRANGE', KEYS[2], ARGV[7], -1)
+for _, old_id in ipairs(dropped) do
+    redis.call('HDEL', KEYS[3], old_id)
+end
+redis.call('LTRIM', KEYS[2], 0, tonumber(ARGV[7]) - 1)
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+redis.call('ZADD', KEYS[4], ARGV[4], order_id)
+redis.call('ZADD', KEYS[5], ARGV[4], order_id)
+redis.call('ZREMRANGEBYSCORE', KEYS[4], '-inf', ARGV[5])
+local archive = ARGV[8] ~= ''
+for i = 6, archive and #KEYS - 1 or #KEYS do
+    redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', ARGV[5])
+end
+if archive then
+    redis.call('XADD', KEYS[#KEYS], 'MAXLEN', '~', ARGV[8], '*', 'order_id', order_id, 'order', ARGV[2])
+end
+"""
+
+_commit = None
+
+
+def business_now():
+    return datetime.now(BUSINESS_TZ)
+
+
+def start_of_business_day():
+    return business_now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+
+def order_key(order_id):
+    return f"order:{order_id}"
+
+
+def status_key(status):
+    return f"orders_by_status:{status}"
+
+
+def user_orders_key(sender):
+    return f"user_orders:{sender}"
+
+
+def user_summaries_key(sender):
+    return f"user_order_summaries:{sender}"
+
+
+def order_summary(order):
+    """The few fields 'my orders' shows, kept per customer."""
+    return {
+        'status': order.get('status', 'pending'),
+        'total': order.get('total_amount', 0),
+        'placed': order.get('timestamp', '')[:16].replace('T', ' '),
+        'created_at': order.get('created_at'),
+    }
+
+
+def allocate_order_id(now=None):
+    """Reserve the next order id for the current shop day."""
+    day = (now or business_now()).strftime("%y%m%d")
+    seq_key = f"order_seq:{day}"
+    while True:
+        pipe = redis_client.pipeline()
+        pipe.incr(seq_key)
+        pipe.expire(seq_key, ORDER_SEQ_TTL)
+        seq, _ = pipe.execute()
+        order_id = f"{day}{seq:04d}"
+        if not redis_client.exists(order_key(order_id)):
+            return order_id
+
+
+def commit_order(order_id, sender, order_data):
+    """Write an order, its place in the sender's history and its indexes in one atomic step."""
+    global _commit
+    if _commit is None:
+        _commit = redis_client.register_script(COMMIT_SCRIPT)
+    created = time.time()
+    order_data['created_at'] = created
+    order_data['sender'] = sender
+    status = order_data.get('status', 'pending')
+    keys = [order_key(order_id), user_orders_key(sender), user_summaries_key(sender),
+            ORDERS_BY_TIME_KEY, status_key(status)] + [status_key(s) for s in ORDER_STATUSES]
+    if ARCHIVE_STREAM_KEY:
+        keys.append(ARCHIVE_STREAM_KEY)
+    _commit(
+        keys=keys,
+        args=[order_id, json.dumps(order_data), ORDER_TTL, created, created - ORDER_TTL,
+              json.dumps(order_summary(order_data)), USER_ORDER_HISTORY,
+              ARCHIVE_STREAM_MAXLEN if ARCHIVE_STREAM_KEY else ""],
+    )
+
+
+def get_order(order_id):
+    order_json = redis_client.get(order_key(order_id))
+    return json.loads(order_json) if order_json else None
+
+
+def fetch_orders(order_ids):
+    """Orders for order_ids in one MGET, skipping any that have expired."""
+    if not order_ids:
+        return []
+    return [json.loads(order_json) for order_json in redis_client.mget([order_key(i) for i in order_ids]) if order_json]
+
+
+def orders_since(since, offset=0, count=10):
+    """(total, page) of orders created since the epoch time since, newest first."""
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zcount(ORDERS_BY_TIME_KEY, since, "+inf")
+    pipe.zrevrangebyscore(ORDERS_BY_TIME_KEY, "+inf", since, start=offset, num=count)
+    total, order_ids = pipe.execute()
+    return total, fetch_orders(order_ids)
+
+
+def orders_with_status(status, offset=0, count=10):
+    """(total, page) of orders currently in status, newest first."""
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zcard(status_key(status))
+    pipe.zrevrange(status_key(status), offset, offset + count - 1)
+    total, order_ids = pipe.execute()
+    return total, fetch_orders(order_ids)
+
+
+def user_order_history(sender, count):
+    """Summaries of sender's latest orders, newest first, as (order_id, summary) pairs.
+
+    Ids that have outlived their order are pruned from the history as they are found.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.lrange(user_orders_key(sender), 0, USER_ORDER_HISTORY - 1)
+    pipe.hgetall(user_summaries_key(sender))
+    order_ids, summaries = pipe.execute()
+
+    expired_before = time.time() - ORDER_TTL
+    history, stale, legacy = [], [], []
+    for order_id in order_ids:
+        summary = json.loads(summaries[order_id]) if order_id in summaries else None
+        if summary is None:
+            legacy.append(order_id)
+        elif (summary.get('created_at') or 0) < expired_before:
+            stale.append(order_id)
+        else:
+            history.append((order_id, summary))
+
+    # Histories written before summaries existed: look those orders up once
+    if legacy:
+        orders = dict(zip(legacy, redis_client.mget([order_key(i) for i in legacy])))
+        for order_id in legacy:
+            if orders[order_id] is None:
+                stale.append(order_id)
+            else:
+                history.append((order_id, order_summary(json.loads(orders[order_id]))))
+        history.sort(key=lambda entry: order_ids.index(entry[0]))
+
+    if stale:
+        pipe = redis_client.pipeline(transaction=False)
+        for order_id in stale:
+            pipe.lrem(user_orders_key(sender), 0, order_id)
+        pipe.hdel(user_summaries_key(sender), *stale)
+        pipe.execute()
+    return history[:count]
+
+
+def set_order_status(order_id, status):
+    """Move an order to status, updating its status index, the customer's summary and any archive stream in one transaction.
+
+    Returns the updated order, or None if it doesn't exist (or has expired).
+    """
+    from redis import WatchError
+
+    if status not in ORDER_STATUSES:
+        raise ValueError(f"Unknown order status: {status}")
+
+    key = order_key(order_id)
+    with redis_client.pipeline() as pipe:
+        for _ in range(STATUS_UPDATE_RETRIES):
+            try:
+                pipe.watch(key)
+                order_json = pipe.get(key)
+                if not order_json:
+                    pipe.unwatch()
+                    return None
+                order = json.loads(order_json)
+                previous = order.get('status', 'pending')
+                created = order.get('created_at') or pipe.zscore(ORDERS_BY_TIME_KEY, order_id) or time.time()
+                order['status'] = status
+                sender = order.get('sender') or order.get('user_data', {}).get('payer_phone')
+                summaries = user_summaries_key(sender)
+                if sender:
+                    pipe.watch(summaries)
+                has_summary = sender and pipe.hexists(summaries, order_id)
+                order_json = json.dumps(order)
+                pipe.multi()
+                pipe.set(key, order_json, keepttl=True)
+                pipe.zrem(status_key(previous), order_id)
+                pipe.zadd(status_key(status), {order_id: created})
+                if has_summary:
+                    pipe.hset(summaries, order_id, json.dumps(order_summary(order)))
+                if ARCHIVE_STREAM_KEY:
+                    pipe.xadd(ARCHIVE_STREAM_KEY, {"order_id": order_id, "order": order_json},
+                              maxlen=ARCHIVE_STREAM_MAXLEN, approximate=True)
+                pipe.execute()
+                return order
+            except WatchError:
+                continue
+    raise RuntimeError(f"Could not update order {order_id} after {STATUS_UPDATE_RETRIES} attempts")
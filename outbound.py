@@ -0,0 +1,63 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+# Threads shared by every batch in the process for outbound Graph API calls
+OUTBOUND_THREADS = int(os.environ.get("OUTBOUND_THREADS", 16))
+
+_pool = ThreadPoolExecutor(max_workers=OUTBOUND_THREADS, thread_name_prefix="outbound")
+_local = threading.local()
+
+
+def _run_after(previous, fn, args):
+    # The executor is FIFO, so ``previous`` was started before us and this
+    # wait never blocks on work still sitting in the queue
+    if previous is not None:
+        wait([previous])
+    return fn(*args)
+
+
+class OutboundBatch:
+    """Sends started during one message. Different recipients go out in
+    parallel; sends to the same recipient go out in the order they were made."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tails = {}
+        self.futures = []
+
+    def submit(self, recipient, fn, args):
+        with self.lock:
+            future = _pool.submit(_run_after, self.tails.get(recipient), fn, args)
+            self.tails[recipient] = future
+            self.futures.append(future)
+
+    def wait(self):
+        """Block until every send has been acknowledged or has failed."""
+        done, _ = wait(self.futures)
+        for future in done:
+            if future.exception() is not None:
+                logging.error(f"❌ Outbound send failed: {future.exception()}")
+
+
+@contextmanager
+def outbound_batch():
+    """Run send()s in this block concurrently and wait for all of them on exit."""
+    batch = OutboundBatch()
+    previous = getattr(_local, "batch", None)
+    _local.batch = batch
+    try:
+        yield batch
+    finally:
+        _local.batch = previous
+        batch.wait()
+
+
+def dispatch(recipient, fn, *args):
+    """Call fn(*args) in the active batch, or right away when there is none."""
+    batch = getattr(_local, "batch", None)
+    if batch is None:
+        return fn(*args)
+    batch.submit(recipient, fn, args)
@@ -1,5 +1,14 @@
+import hashlib
+
+
+def product_code(name):
+    # Stable across processes and deploys as long as the product name doesn't change
+    return hashlib.md5(name.strip().lower().encode("utf-8")).hexdigest()[:8]
+
+
 class Product:
-    def __init__(self, name, price, description="", stock=0):
+    def __init__(self, name, price, description="", stock=0, product_id=None):
+        self.id = product_id or product_code(name)
         self.name = name
         self.price = price
         self.description = description
@@ -0,0 +1,118 @@
+import os
+import logging
+import time
+import uuid
+from db import redis_client
+
+# Sized to the WhatsApp Cloud API messaging tier: sustained sends per second
+# per business phone number, and how many may go out back-to-back
+SEND_RATE = float(os.environ.get("SEND_RATE_PER_SECOND", 80))
+SEND_BURST = float(os.environ.get("SEND_BURST", 80))
+
+# A send still waiting for a slot after this long is dropped
+MAX_SEND_WAIT_MS = int(os.environ.get("SEND_MAX_WAIT_MS", 30000))
+
+# Refill by elapsed time on the Redis clock, then take a token if there is
+# one for this sender after everyone queued ahead of it. Waiters queue in
+# the sorted set KEYS[2] by arrival time; a waiter not yet queued counts as
+# last. Returns 0 when a token was taken, otherwise how many ms until there
+# will be enough for this waiter's place in the queue. Waiters older than
+# the longest allowed wait belong to processes that died and are trimmed.
+TAKE_TOKEN_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local max_wait = tonumber(ARGV[4])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now - max_wait)
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - ts, 0) * rate / 1000)
+local ahead = redis.call('ZRANK', KEYS[2], ARGV[3]) or redis.call('ZCARD', KEYS[2])
+local wait = 0
+if tokens >= ahead + 1 then
+    tokens = tokens - 1
+    redis.call('ZREM', KEYS[2], ARGV[3])
+else
+    redis.call('ZADD', KEYS[2], 'NX', now, ARGV[3])
+    redis.call('PEXPIRE', KEYS[2], max_wait + 1000)
+    wait = math.ceil((ahead + 1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + 1000)
+return wait
+"""
+
+_take_token = None
+
+
+def _bucket_key(phone_id):
+    return f"send_bucket:{phone_id}"
+
+
+def _queue_key(phone_id):
+    return f"send_queue:{phone_id}"
+
+
+def take_token(phone_id, waiter):
+    """Try to take one send token for waiter; returns 0 on success or ms to wait otherwise."""
+    global _take_token
+    if _take_token is None:
+        _take_token = redis_client.register_script(TAKE_TOKEN_SCRIPT)
+    return int(_take_token(
+        keys=[_bucket_key(phone_id), _queue_key(phone_id)],
+        args=[SEND_RATE, SEND_BURST, waiter, MAX_SEND_WAIT_MS],
+    ))
+
+
+def wait_for_send_slot(phone_id):
+    """Block until phone_id may send another message. Returns False if the send should be dropped.
+
+    Sends over the limit wait their turn here, first come first served,
+    instead of being rejected with a 429. Waiters are queued in
+    send_queue:{phone_id} so every worker sees the backlog. A send that has
+    waited MAX_SEND_WAIT_MS gives up. If Redis is unreachable the send goes
+    ahead unthrottled.
+    """
+    waiter = uuid.uuid4().hex
+    deadline = time.monotonic() + MAX_SEND_WAIT_MS / 1000
+    try:
+        wait_ms = take_token(phone_id, waiter)
+        if not wait_ms:
+            return True
+        try:
+            while wait_ms:
+                if time.monotonic() + wait_ms / 1000 > deadline:
+                    return False
+                time.sleep(wait_ms / 1000)
+                wait_ms = take_token(phone_id, waiter)
+        finally:
+            if wait_ms:
+                redis_client.zrem(_queue_key(phone_id), waiter)
+        return True
+    except Exception as e:
+        logging.error(f"❌ Send rate limiter unavailable, sending anyway: {e}")
+        return True
+
+
+def bucket_status(phone_id):
+    """Current token fill and number of queued sends for phone_id."""
+    seconds, micros = redis_client.time()
+    now = seconds * 1000 + micros // 1000
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hmget(_bucket_key(phone_id), "tokens", "ts")
+    # Waiters older than the longest wait were left by processes that died
+    pipe.zcount(_queue_key(phone_id), now - MAX_SEND_WAIT_MS, "+inf")
+    (tokens, ts), queued = pipe.execute()
+    if tokens is None:
+        fill = SEND_BURST
+    else:
+        fill = min(SEND_BURST, float(tokens) + max(now - int(ts), 0) * SEND_RATE / 1000)
+    return {
+        "phone_id": phone_id,
+        "tokens": round(fill, 2),
+        "capacity": SEND_BURST,
+        "rate_per_second": SEND_RATE,
+        "queued": int(queued or 0),
+    }
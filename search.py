@@ -0,0 +1,115 @@
+import re
+from bisect import bisect_left
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Weight of a whole-word hit relative to a full trigram match of the word
+TOKEN_WEIGHT = 2.0
+# Share of a query word's trigrams that must match before a product counts
+MIN_GRAM_SHARE = 0.4
+# Results scoring below this fraction of the best match are noise ("rice" vs "choice")
+MIN_RELATIVE_SCORE = 0.5
+
+
+def tokenize(text):
+    return _WORD.findall(text.lower())
+
+
+def normalize(text):
+    return " ".join(tokenize(text))
+
+
+def trigrams(token):
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductIndex:
+    """Inverted index over product names and descriptions.
+
+    Whole words and character trigrams both map to product positions, so a
+    query matches exact words, prefixes ("maz") and small typos ("mazeo").
+    Built once per catalog snapshot; searching only touches the posting
+    lists of the query's own words and trigrams.
+    """
+
+    def __init__(self, products):
+        self.products = tuple(products)
+        self.tokens = {}
+        self.grams = {}
+        for position, product in enumerate(self.products):
+            for token in set(tokenize(f"{product.name} {product.description}")):
+                self.tokens.setdefault(token, set()).add(position)
+                for gram in trigrams(token):
+                    self.grams.setdefault(gram, set()).add(position)
+        self.tokens = {token: frozenset(hits) for token, hits in self.tokens.items()}
+        self.grams = {gram: frozenset(hits) for gram, hits in self.grams.items()}
+
+    def search(self, query, limit=10):
+        """Return up to ``limit`` products ranked by how well they match ``query``."""
+        return self.rank(query)[:limit]
+
+    def rank(self, query):
+        """Every product that matches ``query``, best match first."""
+        scores = {}
+        for token in set(tokenize(query)):
+            token_scores = {}
+            for position in self.tokens.get(token, ()):
+                token_scores[position] = TOKEN_WEIGHT
+            grams = trigrams(token)
+            counts = {}
+            for gram in grams:
+                for position in self.grams.get(gram, ()):
+                    counts[position] = counts.get(position, 0) + 1
+            for position, count in counts.items():
+                share = count / len(grams)
+                if share >= MIN_GRAM_SHARE:
+                    token_scores[position] = token_scores.get(position, 0) + share
+            for position, score in token_scores.items():
+                scores[position] = scores.get(position, 0) + score
+
+        if not scores:
+            return []
+        cutoff = max(scores.values()) * MIN_RELATIVE_SCORE
+        ranked = sorted(
+            (position for position, score in scores.items() if score >= cutoff),
+            key=lambda position: (-scores[position], self.products[position].name)
+        )
+        return [self.products[position] for position in ranked]
+
+
+class NameIndex:
+    """Resolves what an admin types to catalog products.
+
+    Tries, in order: an exact normalized name or product code (dict lookup),
+    names starting with the query (binary search over sorted names), then
+    fuzzy matching through a ProductIndex over every product.
+    """
+
+    def __init__(self, products):
+        products = tuple(products)
+        self.exact = {}
+        for product in products:
+            self.exact[product.id] = product
+            self.exact[normalize(product.name)] = product
+        ordered = sorted(products, key=lambda product: normalize(product.name))
+        self.names = [normalize(product.name) for product in ordered]
+        self.ordered = ordered
+        self.fuzzy = ProductIndex(products)
+
+    def resolve(self, query, limit=5):
+        """Return (matches, total): exactly one match when unambiguous, else up to
+        ``limit`` candidates out of ``total``."""
+        key = normalize(query)
+        if not key:
+            return [], 0
+        product = self.exact.get(query.strip().lower()) or self.exact.get(key)
+        if product is not None:
+            return [product], 1
+
+        start = bisect_left(self.names, key)
+        end = bisect_left(self.names, key + "\uffff", start)
+        if start < end:
+            return self.ordered[start:min(end, start + limit)], end - start
+        ranked = self.fuzzy.rank(query)
+        return ranked[:limit], len(ranked)
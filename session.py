@@ -0,0 +1,241 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from db import redis_client
+from logs import mask_phone
+
+STATE_TTL = 86400
+
+# Sorted set of phone number -> last state write, for the active sessions gauge
+ACTIVE_SESSIONS_KEY = "active_sessions"
+ACTIVE_SESSION_WINDOW = int(os.environ.get("ACTIVE_SESSION_WINDOW", 1800))
+
+# Retries for an update made outside a session that lost a race against another writer
+STATE_UPDATE_RETRIES = 10
+
+# Writes a session back only if the stored state is still the one it loaded
+# ('' for none), so a write made in between is never lost
+FLUSH_SCRIPT = """
+if (redis.call('GET', KEYS[1]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+redis.call('ZADD', KEYS[2], ARGV[4], ARGV[5])
+return 1
+"""
+
+# Lookup tables older sessions carried around; they now come from the catalog
+LEGACY_STATE_KEYS = ('category_names', 'delivery_areas', 'area_names')
+
+# A crashed worker's lease frees itself after LEASE_TTL_MS; waiters poll until
+# then. A live holder's lease is renewed every third of that, however long
+# its message takes.
+LEASE_TTL_MS = 30000
+LEASE_POLL_SECONDS = 0.05
+
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+RENEW_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_flush = None
+_release_lease = None
+_renew_lease = None
+_local = threading.local()
+
+# Leases this process holds, token -> (key, sender), and the thread renewing them
+_held_leases = {}
+_held_lock = threading.Lock()
+_lease_keeper = None
+
+
+class LeaseTimeout(Exception):
+    pass
+
+
+class SessionConflict(Exception):
+    """The stored state changed after the session loaded it."""
+
+
+class SessionUnavailable(Exception):
+    """A user's state couldn't be loaded, so nothing was done with their message."""
+
+
+class Session:
+    """A user's state loaded once per message and written back once at the end."""
+
+    def __init__(self, phone_number, state_json):
+        self.phone_number = phone_number
+        self.state_json = state_json
+        self.state = json.loads(state_json) if state_json else {'step': 'ask_name', 'sender': phone_number}
+        self.dirty = False
+        for key in LEGACY_STATE_KEYS:
+            if self.state.pop(key, None) is not None:
+                self.dirty = True
+
+    @classmethod
+    def load(cls, phone_number):
+        return cls(phone_number, redis_client.get(f"user_state:{phone_number}"))
+
+    def update(self, updates):
+        self.state.update(updates)
+        self.dirty = True
+
+    def flush(self):
+        """Write the state back if it changed. Returns True when Redis was written.
+
+        Raises SessionConflict, writing nothing, if someone else wrote the
+        state since it was loaded.
+        """
+        global _flush
+        if not self.dirty:
+            return False
+        self.state['phone_number'] = self.phone_number
+        self.state.setdefault('sender', self.phone_number)
+        state_json = json.dumps(self.state)
+        self.dirty = False
+        if state_json == self.state_json:
+            return False
+        if _flush is None:
+            _flush = redis_client.register_script(FLUSH_SCRIPT)
+        written = _flush(
+            keys=[f"user_state:{self.phone_number}", ACTIVE_SESSIONS_KEY],
+            args=[self.state_json or "", state_json, STATE_TTL, time.time(), self.phone_number],
+        )
+        if not written:
+            raise SessionConflict(f"State of {mask_phone(self.phone_number)} changed while handling a message")
+        self.state_json = state_json
+        return True
+
+
+def active_session_count():
+    """Customers whose state was written within ACTIVE_SESSION_WINDOW.
+
+    Older entries are trimmed here rather than on every write.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zremrangebyscore(ACTIVE_SESSIONS_KEY, "-inf", time.time() - ACTIVE_SESSION_WINDOW)
+    pipe.zcard(ACTIVE_SESSIONS_KEY)
+    return pipe.execute()[1]
+
+
+@contextmanager
+def user_session(phone_number):
+    """Route get/update_user_state for phone_number through one Session for the block.
+
+    The session is flushed only if the block finishes without raising.
+    Raises SessionUnavailable, before the block runs, if the state can't be loaded.
+    """
+    try:
+        session = Session.load(phone_number)
+    except Exception as e:
+        raise SessionUnavailable(f"Could not load the state of {mask_phone(phone_number)}: {e}") from e
+    previous = getattr(_local, "session", None)
+    _local.session = session
+    try:
+        yield session
+        session.flush()
+    finally:
+        _local.session = previous
+
+
+def _active_session(phone_number):
+    session = getattr(_local, "session", None)
+    if session is not None and session.phone_number == phone_number:
+        return session
+    return None
+
+
+# Redis state functions
+def get_user_state(phone_number):
+    session = _active_session(phone_number)
+    if session is not None:
+        return dict(session.state)
+    state_json = redis_client.get(f"user_state:{phone_number}")
+    if state_json:
+        return json.loads(state_json)
+    return {'step': 'ask_name', 'sender': phone_number}
+
+
+def update_user_state(phone_number, updates):
+    session = _active_session(phone_number)
+    if session is not None:
+        session.update(updates)
+        return
+
+    # Outside a session: merge into the latest state, again if it changed under us
+    for _ in range(STATE_UPDATE_RETRIES):
+        session = Session.load(phone_number)
+        session.update(updates)
+        try:
+            session.flush()
+            return
+        except SessionConflict:
+            continue
+    raise RuntimeError(f"Could not update state for {mask_phone(phone_number)} after {STATE_UPDATE_RETRIES} attempts")
+
+
+def _keep_leases():
+    global _renew_lease
+    while True:
+        time.sleep(LEASE_TTL_MS / 3000)
+        with _held_lock:
+            held = list(_held_leases.items())
+        if not held:
+            continue
+        if _renew_lease is None:
+            _renew_lease = redis_client.register_script(RENEW_LEASE_SCRIPT)
+        for token, (key, sender) in held:
+            try:
+                if not _renew_lease(keys=[key], args=[token, LEASE_TTL_MS]):
+                    with _held_lock:
+                        lost = _held_leases.pop(token, None) is not None
+                    if lost:
+                        logging.error(f"❌ Lost the conversation lease of {mask_phone(sender)} before finishing")
+            except Exception as e:
+                logging.error(f"❌ Could not renew the conversation lease of {mask_phone(sender)}: {e}")
+
+
+def _keep_lease(token, key, sender):
+    global _lease_keeper
+    with _held_lock:
+        _held_leases[token] = (key, sender)
+        if _lease_keeper is None:
+            _lease_keeper = threading.Thread(target=_keep_leases, name="lease-keeper", daemon=True)
+            _lease_keeper.start()
+
+
+@contextmanager
+def sender_lease(sender):
+    """Hold an exclusive per-sender lease so only one worker runs a conversation at a time."""
+    global _release_lease
+    key = f"lease:{sender}"
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + 2 * LEASE_TTL_MS / 1000
+    while not redis_client.set(key, token, nx=True, px=LEASE_TTL_MS):
+        if time.monotonic() > deadline:
+            raise LeaseTimeout(f"Timed out waiting for the conversation lease of {mask_phone(sender)}")
+        time.sleep(LEASE_POLL_SECONDS)
+
+    _keep_lease(token, key, sender)
+    try:
+        yield
+    finally:
+        with _held_lock:
+            _held_leases.pop(token, None)
+        if _release_lease is None:
+            _release_lease = redis_client.register_script(RELEASE_LEASE_SCRIPT)
+        _release_lease(keys=[key], args=[token])
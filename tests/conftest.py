@@ -0,0 +1,34 @@
+"""Tests run against fakeredis (an in-process Redis with Lua support).
+
+    pip install -r requirements-test.txt
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("OWNER_PHONE", "263700000001")
+os.environ.setdefault("PHONE_ID", "100000000000001")
+
+import fakeredis
+
+import db
+
+# One client for the whole run: registered Lua scripts stay bound to it
+_client = fakeredis.FakeStrictRedis(decode_responses=True)
+db.redis_client.use(_client)
+
+
+@pytest.fixture
+def redis_client():
+    """An empty Redis behind every module."""
+    import inventory
+
+    _client.flushall()
+    inventory._seeded_for = None
+    inventory.invalidate_availability()
+    return _client
@@ -0,0 +1,75 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from sqlalchemy import select
+
+import archiver
+import message_queue
+import order_store
+
+SENDER = "263771234567"
+
+
+@pytest.fixture
+def archive(redis_client, tmp_path, monkeypatch):
+    monkeypatch.setattr(order_store, "ARCHIVE_STREAM_KEY", "order_archive")
+    monkeypatch.setattr(archiver, "ARCHIVE_STREAM_KEY", "order_archive")
+    message_queue.ensure_group("order_archive", archiver.GROUP)
+    return archiver.Archive(f"sqlite:///{tmp_path}/archive.db")
+
+
+def place(order_id):
+    order_store.commit_order(order_id, SENDER, {
+        'total_amount': 43.98,
+        'payment_method': "EFT\nBank: CBZ",
+        'timestamp': '2026-10-17T09:30:00',
+        'items': [{'name': "Aromat Original 50g", 'price': 24.99, 'quantity': 1},
+                  {'name': "Bakers Inn Bread", 'price': 18.99, 'quantity': 1}],
+    })
+
+
+def read():
+    return message_queue.read_messages("archiver-a", 100, None, stream="order_archive", group=archiver.GROUP)
+
+
+def rows(archive, table):
+    with archive.engine.connect() as conn:
+        return conn.execute(select(table)).mappings().all()
+
+
+def test_orders_and_items_are_archived_once(archive, redis_client):
+    place("2610170001")
+    entries = read()
+    assert archiver.archive_batch(archive, entries) == 1
+    # A batch redelivered after a crash changes nothing
+    archiver.archive_batch(archive, entries)
+
+    [order] = rows(archive, archive.orders)
+    assert (order["order_id"], order["sender"], order["status"]) == ("2610170001", SENDER, "pending")
+    assert float(order["total_amount"]) == 43.98
+    assert order["payment_method"] == "EFT"
+    items = rows(archive, archive.order_items)
+    assert [(item["line"], item["name"], item["quantity"]) for item in items] == [
+        (1, "Aromat Original 50g", 1), (2, "Bakers Inn Bread", 1)
+    ]
+    assert redis_client.xlen("order_archive") == 0
+
+
+def test_newer_status_applies_and_older_does_not(archive):
+    place("2610170001")
+    archiver.archive_batch(archive, read())
+    order_store.set_order_status("2610170001", "paid")
+    order_store.set_order_status("2610170001", "delivered")
+    archiver.archive_batch(archive, read())
+
+    [order] = rows(archive, archive.orders)
+    assert order["status"] == "delivered"
+    assert len(rows(archive, archive.order_items)) == 2
+
+    # A late retry of an earlier state doesn't roll the order back
+    stale = order_store.get_order("2610170001")
+    stale["status"] = "paid"
+    archive.store({"2610170001": (order["version"] - 1, stale)})
+    [order] = rows(archive, archive.orders)
+    assert order["status"] == "delivered"
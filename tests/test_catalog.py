@@ -0,0 +1,77 @@
+import json
+import os
+import pickle
+
+import orders
+
+
+class Planted:
+    def __reduce__(self):
+        return (exec, ("import os; os.environ['PLANTED_SNAPSHOT_RAN'] = '1'",))
+
+
+def test_snapshot_is_reused(tmp_path, monkeypatch):
+    monkeypatch.setattr(orders, "CATALOG_SNAPSHOT_PATH", str(tmp_path / "snapshots" / "catalog.pickle"))
+    rows = orders.load_catalog_rows()
+
+    assert os.stat(tmp_path / "snapshots").st_mode & 0o777 == 0o700
+    assert os.stat(tmp_path / "snapshots" / "catalog.pickle").st_mode & 0o777 == 0o600
+    assert orders.load_catalog_rows() == rows
+
+
+def test_snapshot_in_a_shared_directory_is_never_unpickled(tmp_path, monkeypatch):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o1777)
+    snapshot = shared / "catalog.pickle"
+    snapshot.write_bytes(pickle.dumps(Planted()))
+    monkeypatch.setattr(orders, "CATALOG_SNAPSHOT_PATH", str(snapshot))
+
+    rows = orders.load_catalog_rows()
+    assert rows and "PLANTED_SNAPSHOT_RAN" not in os.environ
+
+
+def test_writable_snapshot_is_never_unpickled(tmp_path, monkeypatch):
+    snapshot = tmp_path / "catalog.pickle"
+    snapshot.write_bytes(pickle.dumps(Planted()))
+    snapshot.chmod(0o666)
+    tmp_path.chmod(0o700)
+    monkeypatch.setattr(orders, "CATALOG_SNAPSHOT_PATH", str(snapshot))
+
+    assert orders.load_catalog_rows()
+    assert "PLANTED_SNAPSHOT_RAN" not in os.environ
+
+
+def test_malformed_snapshot_is_rebuilt(tmp_path, monkeypatch):
+    snapshot = tmp_path / "catalog.pickle"
+    snapshot.write_bytes(pickle.dumps((1, 2, 3)))
+    snapshot.chmod(0o600)
+    tmp_path.chmod(0o700)
+    monkeypatch.setattr(orders, "CATALOG_SNAPSHOT_PATH", str(snapshot))
+
+    rows = orders.load_catalog_rows()
+    assert rows
+    assert orders.load_catalog_rows() == rows
+
+
+def test_version_changes_when_products_move(tmp_path, monkeypatch):
+    import main
+
+    monkeypatch.setattr(orders, "CATALOG_SNAPSHOT_PATH", str(tmp_path / "catalog.pickle"))
+    with open(orders.CATALOG_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    source = tmp_path / "catalog.json"
+    source.write_text(json.dumps(data), encoding="utf-8")
+    before = orders.Catalog(orders.OrderSystem(str(source)))
+    state = {'catalog_version': before.version, 'current_category_index': 0}
+    assert main.category_index(state, before) == 0
+
+    data["categories"][0]["products"].insert(0, {"name": "Zimgold Cooking Oil 2L", "price": 79.99, "stock": 10})
+    source.write_text(json.dumps(data), encoding="utf-8")
+    after = orders.Catalog(orders.OrderSystem(str(source)))
+
+    assert after.category_names == before.category_names
+    assert after.version != before.version
+    assert main.category_index(state, after) is None
+    # Stock coming and going keeps the numbering, and so the version
+    assert orders.Catalog(after.order_system, frozenset({"Zimgold Cooking Oil 2L"})).version == after.version
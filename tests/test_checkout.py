@@ -0,0 +1,39 @@
+import inventory
+import main
+
+
+def checkout_state(product, quantity):
+    user = main.User("Tendai Moyo", "263771000001")
+    user.add_to_cart(product, quantity)
+    user.checkout_data = {"receiver_name": "Rudo Ncube", "receiver_id": "63-123456A42", "phone": "0771234567"}
+    return {"sender": "263771000001", "step": "await_payment_selection", "user": user.to_dict()}
+
+
+def test_failed_order_commit_puts_stock_back(redis_client, monkeypatch):
+    product = inventory.get_catalog().order_system.get_all_products()[0]
+    inventory.seed_inventory()
+    redis_client.hset(inventory.INVENTORY_KEY, product.name, 5)
+    sent = []
+    monkeypatch.setattr(main, "send", lambda answer, sender, phone_id: sent.append(answer))
+
+    def fail(*args):
+        raise ConnectionError("Redis went away")
+
+    monkeypatch.setattr(main, "commit_order", fail)
+    state = main.handle_payment_selection("1", checkout_state(product, 2), "100000000000001")
+
+    assert state["step"] == "await_payment_selection"
+    assert int(redis_client.hget(inventory.INVENTORY_KEY, product.name)) == 5
+    assert "couldn't place your order" in sent[-1]
+
+
+def test_order_commit_takes_stock(redis_client, monkeypatch):
+    product = inventory.get_catalog().order_system.get_all_products()[0]
+    inventory.seed_inventory()
+    redis_client.hset(inventory.INVENTORY_KEY, product.name, 5)
+    monkeypatch.setattr(main, "send", lambda answer, sender, phone_id: None)
+
+    state = main.handle_payment_selection("1", checkout_state(product, 2), "100000000000001")
+
+    assert state["step"] == "ask_place_another_order"
+    assert int(redis_client.hget(inventory.INVENTORY_KEY, product.name)) == 3
@@ -0,0 +1,78 @@
+import inventory
+from orders import get_catalog
+
+
+def products(count):
+    return get_catalog().order_system.get_all_products()[:count]
+
+
+def stock(redis_client, product):
+    return int(redis_client.hget(inventory.INVENTORY_KEY, product.name))
+
+
+def test_reserve_takes_every_line(redis_client):
+    first, second = products(2)
+    inventory.seed_inventory()
+    redis_client.hset(inventory.INVENTORY_KEY, mapping={first.name: 5, second.name: 3})
+
+    assert inventory.reserve_stock([(first, 2), (second, 3)]) is None
+    assert stock(redis_client, first) == 3
+    assert stock(redis_client, second) == 0
+
+
+def test_reserve_is_all_or_nothing(redis_client):
+    first, second = products(2)
+    inventory.seed_inventory()
+    redis_client.hset(inventory.INVENTORY_KEY, mapping={first.name: 5, second.name: 1})
+
+    assert inventory.reserve_stock([(first, 2), (second, 2)]) == second.name
+    assert stock(redis_client, first) == 5
+    assert stock(redis_client, second) == 1
+
+
+def test_reserve_adds_up_repeated_lines(redis_client):
+    product, = products(1)
+    inventory.seed_inventory()
+    redis_client.hset(inventory.INVENTORY_KEY, product.name, 3)
+
+    assert inventory.reserve_stock([(product, 2), (product, 2)]) == product.name
+    assert stock(redis_client, product) == 3
+
+
+def test_release_returns_reserved_stock(redis_client):
+    first, second = products(2)
+    inventory.seed_inventory()
+    redis_client.hset(inventory.INVENTORY_KEY, mapping={first.name: 5, second.name: 3})
+    cart = [(first, 2), (second, 1)]
+
+    assert inventory.reserve_stock(cart) is None
+    inventory.release_stock(cart)
+    assert stock(redis_client, first) == 5
+    assert stock(redis_client, second) == 3
+
+
+def test_sold_out_products_keep_their_number(redis_client):
+    catalog = inventory.current_catalog()
+    category = catalog.category_names[0]
+    first, second = catalog.list_products(category)[:2]
+    redis_client.hset(inventory.INVENTORY_KEY, first.name, 0)
+    inventory.invalidate_availability()
+
+    catalog = inventory.current_catalog()
+    assert catalog.list_products(category)[1] is second
+    assert catalog.is_sold_out(first)
+    assert "(sold out)" in catalog.page(category, 0).splitlines()[0]
+
+
+def test_set_stock_says_how_many_more_matched(redis_client):
+    reply = inventory.set_stock("1kg", 5)
+    shown = reply.count("• ")
+    matches, total = get_catalog().resolve_product("1kg")
+    assert shown == len(matches) == 5
+    assert f"…and {total - 5} more" in reply
+
+
+def test_set_stock_by_code_sets_that_product(redis_client):
+    product, = products(1)
+    assert inventory.set_stock(product.id, 7).startswith("✅")
+    assert stock(redis_client, product) == 7
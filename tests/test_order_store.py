@@ -0,0 +1,108 @@
+import threading
+import time
+from datetime import datetime
+
+import order_store
+
+DAY = datetime(2026, 10, 17, 9, 30, tzinfo=order_store.BUSINESS_TZ)
+
+
+def test_ids_are_sequential_per_day(redis_client):
+    assert order_store.allocate_order_id(DAY) == "2610170001"
+    assert order_store.allocate_order_id(DAY) == "2610170002"
+    assert order_store.allocate_order_id(DAY.replace(day=18)) == "2610180001"
+    assert 0 < redis_client.ttl("order_seq:261017") <= order_store.ORDER_SEQ_TTL
+
+
+def test_ids_are_unique_under_concurrent_allocation(redis_client):
+    ids = []
+    lock = threading.Lock()
+
+    def allocate():
+        for _ in range(50):
+            order_id = order_store.allocate_order_id(DAY)
+            with lock:
+                ids.append(order_id)
+
+    threads = [threading.Thread(target=allocate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(ids)) == len(ids) == 400
+    assert sorted(ids) == [f"261017{seq:04d}" for seq in range(1, 401)]
+
+
+def test_ids_of_existing_orders_are_skipped(redis_client):
+    # The day's counter was lost but its first orders are still there
+    redis_client.set(order_store.order_key("2610170001"), "{}")
+    redis_client.set(order_store.order_key("2610170002"), "{}")
+    assert order_store.allocate_order_id(DAY) == "2610170003"
+
+
+def place(sender, total=10, status=None):
+    order_id = order_store.allocate_order_id(DAY)
+    order = {'total_amount': total, 'timestamp': '2026-10-17T09:30:00'}
+    if status:
+        order['status'] = status
+    order_store.commit_order(order_id, sender, order)
+    return order_id
+
+
+def test_commit_caps_history_and_summaries(redis_client, monkeypatch):
+    monkeypatch.setattr(order_store, "USER_ORDER_HISTORY", 3)
+    ids = [place("263771234567", total=n) for n in range(5)]
+
+    assert redis_client.lrange(order_store.user_orders_key("263771234567"), 0, -1) == ids[:1:-1]
+    assert sorted(redis_client.hkeys(order_store.user_summaries_key("263771234567"))) == ids[2:]
+    assert [order_id for order_id, _ in order_store.user_order_history("263771234567", 10)] == ids[:1:-1]
+    # The orders themselves are still there for admins
+    assert order_store.get_order(ids[0])['total_amount'] == 0
+
+
+def test_commit_trims_index_entries_of_expired_orders(redis_client, monkeypatch):
+    monkeypatch.setattr(order_store, "ARCHIVE_STREAM_KEY", "order_archive")
+    expired = time.time() - order_store.ORDER_TTL - 60
+    for key in (order_store.ORDERS_BY_TIME_KEY, order_store.status_key("pending"), order_store.status_key("paid")):
+        redis_client.zadd(key, {"2610010001": expired})
+
+    order_id = place("263771234567")
+
+    assert redis_client.zrange(order_store.ORDERS_BY_TIME_KEY, 0, -1) == [order_id]
+    assert redis_client.zrange(order_store.status_key("pending"), 0, -1) == [order_id]
+    assert redis_client.zrange(order_store.status_key("paid"), 0, -1) == []
+    assert redis_client.xlen("order_archive") == 1
+
+
+def test_status_change_moves_order_between_indexes(redis_client, monkeypatch):
+    monkeypatch.setattr(order_store, "ARCHIVE_STREAM_KEY", "order_archive")
+    order_id = place("263771234567")
+    created = redis_client.zscore(order_store.ORDERS_BY_TIME_KEY, order_id)
+
+    order = order_store.set_order_status(order_id, "paid")
+
+    assert order['status'] == "paid"
+    assert redis_client.zrange(order_store.status_key("pending"), 0, -1) == []
+    assert redis_client.zscore(order_store.status_key("paid"), order_id) == created
+    assert order_store.get_order(order_id)['status'] == "paid"
+    assert order_store.orders_with_status("paid")[0] == 1
+    [(_, summary)] = order_store.user_order_history("263771234567", 10)
+    assert summary['status'] == "paid"
+    assert redis_client.xlen("order_archive") == 2
+
+
+def test_status_change_of_missing_order(redis_client):
+    assert order_store.set_order_status("2610170001", "paid") is None
+    assert redis_client.zcard(order_store.status_key("paid")) == 0
+
+
+def test_nothing_is_archived_without_an_archive_stream(redis_client, monkeypatch):
+    monkeypatch.setattr(order_store, "ARCHIVE_STREAM_KEY", None)
+    redis_client.zadd(order_store.status_key("delivered"), {"2610010001": time.time() - order_store.ORDER_TTL - 60})
+    order_id = place("263771234567")
+    order_store.set_order_status(order_id, "paid")
+
+    assert order_store.get_order(order_id)['status'] == "paid"
+    assert [key for key in redis_client.keys() if redis_client.type(key) == "stream"] == []
+    assert redis_client.zcard(order_store.status_key("delivered")) == 0
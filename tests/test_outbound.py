@@ -0,0 +1,35 @@
+import threading
+import time
+
+import main
+
+CUSTOMER = "263771000001"
+OWNER = "263700000001"
+PHONE_ID = "100000000000001"
+
+
+def test_sends_keep_order_per_recipient_and_finish_before_the_handler_returns(redis_client, monkeypatch):
+    delays = {"first": 0.2, "second": 0, "new order": 0.05}
+    delivered = []
+    lock = threading.Lock()
+
+    def deliver(data, phone_id):
+        time.sleep(delays[data["text"]["body"]])
+        with lock:
+            delivered.append((data["to"], data["text"]["body"]))
+
+    def dispatch(prompt, sender, phone_id):
+        main.send("first", sender, phone_id)
+        main.send("new order", OWNER, phone_id)
+        main.send("second", sender, phone_id)
+
+    monkeypatch.setattr(main, "deliver", deliver)
+    monkeypatch.setattr(main, "dispatch_message", dispatch)
+
+    main.message_handler("hi", CUSTOMER, PHONE_ID)
+
+    assert len(delivered) == 3
+    # The slow first reply still goes out before the second one ...
+    assert [body for to, body in delivered if to == CUSTOMER] == ["first", "second"]
+    # ... while the owner's message doesn't wait behind it
+    assert delivered[0] == (OWNER, "new order")
@@ -0,0 +1,63 @@
+import json
+
+import main
+from orders import CATEGORY_PAGE_SIZE
+
+SENDER = "263771000001"
+PHONE_ID = "100000000000001"
+
+
+def browsing(redis_client, monkeypatch, category, page):
+    sent = []
+    monkeypatch.setattr(main, "send", lambda answer, sender, phone_id: sent.append(answer))
+    catalog = main.current_catalog()
+    redis_client.set(f"user_state:{SENDER}", json.dumps({
+        'sender': SENDER, 'step': 'choose_product', 'user': main.User("Tendai Moyo", SENDER).to_dict(),
+        'catalog_version': catalog.version, 'current_category_index': category, 'current_page_index': page,
+    }))
+    return catalog, sent
+
+
+def position():
+    state = main.get_user_state(SENDER)
+    return state['current_category_index'], state['current_page_index']
+
+
+def test_more_steps_through_pages_then_categories(redis_client, monkeypatch):
+    catalog, sent = browsing(redis_client, monkeypatch, 0, 0)
+    assert catalog.page_count(catalog.category_names[0]) == 2
+
+    main.message_handler("more", SENDER, PHONE_ID)
+    assert position() == (0, 1)
+    assert "(page 2 of 2)" in sent[-1]
+    # Numbers run on from the first page
+    assert f"\n{CATEGORY_PAGE_SIZE + 1}. " in sent[-1]
+
+    main.message_handler("more", SENDER, PHONE_ID)
+    assert position() == (1, 0)
+    assert f"*{catalog.category_names[1]}*" in sent[-1]
+    assert "\n1. " in sent[-1]
+
+
+def test_back_steps_through_pages_then_categories(redis_client, monkeypatch):
+    catalog, sent = browsing(redis_client, monkeypatch, 1, 0)
+
+    # Back from a category's first page lands on the previous category's last page
+    main.message_handler("back", SENDER, PHONE_ID)
+    assert position() == (0, 1)
+    assert f"*{catalog.category_names[0]}* (page 2 of 2)" in sent[-1]
+
+    main.message_handler("back", SENDER, PHONE_ID)
+    assert position() == (0, 0)
+    main.message_handler("back", SENDER, PHONE_ID)
+    assert position() == (0, 0)
+
+
+def test_product_numbers_continue_across_pages(redis_client, monkeypatch):
+    catalog, sent = browsing(redis_client, monkeypatch, 0, 1)
+    expected = catalog.list_products(catalog.category_names[0])[CATEGORY_PAGE_SIZE]
+
+    main.message_handler(str(CATEGORY_PAGE_SIZE + 1), SENDER, PHONE_ID)
+
+    assert main.get_user_state(SENDER)['selected_product'] == expected.id
+    assert sent[-1] == f"You selected {expected.name}. How many would you like to add?"
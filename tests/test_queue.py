@@ -0,0 +1,46 @@
+import message_queue
+import worker
+
+
+def test_sender_messages_run_in_arrival_order(redis_client, monkeypatch):
+    handled = []
+    monkeypatch.setattr(worker, "handle_message", lambda sender, prompt, phone_id: handled.append(prompt))
+    message_queue.ensure_group()
+    for prompt in ("hi", "Tendai Moyo", "1"):
+        message_queue.enqueue_message("263771000001", prompt, "100000000000001")
+
+    first, second, third = message_queue.read_messages("worker-a", count=3, block_ms=None)
+    # Whichever entry a worker gets to first, it runs the oldest message first
+    worker.drain_inbox(third[1]["sender"])
+    worker.drain_inbox(first[1]["sender"])
+
+    assert handled == ["hi", "Tendai Moyo", "1"]
+    assert message_queue.peek_inbox("263771000001") is None
+
+
+def test_failed_message_still_leaves_the_inbox(redis_client, monkeypatch):
+    def handle(sender, prompt, phone_id):
+        if prompt == "boom":
+            raise ValueError(prompt)
+
+    monkeypatch.setattr(worker, "handle_message", handle)
+    message_queue.enqueue_message("263771000001", "boom", "100000000000001")
+    message_queue.enqueue_message("263771000001", "hi", "100000000000001")
+
+    worker.drain_inbox("263771000001")
+    assert message_queue.peek_inbox("263771000001") is None
+
+
+def test_other_streams_share_the_consumer_helpers(redis_client):
+    message_queue.ensure_group("order_archive", "order_archivers")
+    message_queue.ensure_group("order_archive", "order_archivers")
+    first = redis_client.xadd("order_archive", {"order_id": "2610170001"})
+    second = redis_client.xadd("order_archive", {"order_id": "2610170002"})
+
+    entries = message_queue.read_messages("archiver-a", 10, None, stream="order_archive", group="order_archivers")
+    assert [entry_id for entry_id, _ in entries] == [first, second]
+    message_queue.ack_messages([first, second], stream="order_archive", group="order_archivers")
+
+    assert redis_client.xlen("order_archive") == 0
+    assert redis_client.xpending("order_archive", "order_archivers")["pending"] == 0
+    assert not redis_client.exists(message_queue.STREAM_KEY)
@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+import ratelimit
+
+PHONE_ID = "100000000000001"
+
+
+@pytest.fixture
+def slow_bucket(monkeypatch):
+    monkeypatch.setattr(ratelimit, "SEND_RATE", 10)
+    monkeypatch.setattr(ratelimit, "SEND_BURST", 1)
+
+
+def queue(redis_client):
+    return redis_client.zrange(ratelimit._queue_key(PHONE_ID), 0, -1)
+
+
+def test_waiters_are_served_in_arrival_order(redis_client, slow_bucket):
+    assert ratelimit.take_token(PHONE_ID, "a") == 0
+    first_wait = ratelimit.take_token(PHONE_ID, "b")
+    second_wait = ratelimit.take_token(PHONE_ID, "c")
+    assert 0 < first_wait < second_wait
+    assert queue(redis_client) == ["b", "c"]
+
+    time.sleep(first_wait / 1000 + 0.01)
+    # One token has come back: it is b's, however eager c is
+    assert ratelimit.take_token(PHONE_ID, "c") > 0
+    assert ratelimit.take_token(PHONE_ID, "b") == 0
+    assert queue(redis_client) == ["c"]
+
+
+def test_dead_waiters_are_trimmed(redis_client, slow_bucket):
+    seconds, micros = redis_client.time()
+    now = seconds * 1000 + micros // 1000
+    redis_client.zadd(ratelimit._queue_key(PHONE_ID), {"killed": now - ratelimit.MAX_SEND_WAIT_MS - 1})
+
+    assert ratelimit.bucket_status(PHONE_ID)["queued"] == 0
+    assert ratelimit.take_token(PHONE_ID, "a") == 0
+    assert queue(redis_client) == []
+
+
+def test_send_is_dropped_after_the_wait_limit(redis_client, slow_bucket, monkeypatch):
+    monkeypatch.setattr(ratelimit, "MAX_SEND_WAIT_MS", 150)
+    assert ratelimit.wait_for_send_slot(PHONE_ID)
+    for waiter in "bc":
+        ratelimit.take_token(PHONE_ID, waiter)
+
+    started = time.monotonic()
+    assert not ratelimit.wait_for_send_slot(PHONE_ID)
+    assert time.monotonic() - started < 0.15
+    assert queue(redis_client) == ["b", "c"]
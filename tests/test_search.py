@@ -0,0 +1,58 @@
+import json
+
+import main
+import search
+from products import Product
+
+SENDER = "263771000001"
+PHONE_ID = "100000000000001"
+
+PRODUCTS = [
+    Product("Mazoe Orange Crush 2L", 59.99, "Orange concentrate", stock=10),
+    Product("Ekonol Rice 5kg", 119.29, "Rice", stock=10),
+    Product("Choice Assorted Biscuits", 24.99, "Biscuits", stock=10),
+    Product("Bakers Inn Bread", 23.99, "Brown loaf bread", stock=10),
+]
+
+
+def names(products):
+    return [product.name for product in products]
+
+
+def test_exact_words_and_typos_match():
+    index = search.ProductIndex(PRODUCTS)
+
+    assert names(index.search("bread")) == ["Bakers Inn Bread"]
+    assert names(index.search("mazoe orange")) == ["Mazoe Orange Crush 2L"]
+    assert names(index.search("mazeo")) == ["Mazoe Orange Crush 2L"]
+    assert index.search("kapenta") == []
+
+
+def test_weak_matches_are_cut_off(monkeypatch):
+    index = search.ProductIndex(PRODUCTS)
+    assert names(index.search("rice")) == ["Ekonol Rice 5kg"]
+
+    # "choice" shares trigrams with "rice"; only the relative cutoff keeps it out
+    monkeypatch.setattr(search, "MIN_RELATIVE_SCORE", 0)
+    assert names(index.search("rice")) == ["Ekonol Rice 5kg", "Choice Assorted Biscuits"]
+
+
+def test_search_result_is_chosen_by_number(redis_client, monkeypatch):
+    sent = []
+    monkeypatch.setattr(main, "send", lambda answer, sender, phone_id: sent.append(answer))
+    catalog = main.current_catalog()
+    redis_client.set(f"user_state:{SENDER}", json.dumps({
+        'sender': SENDER, 'step': 'choose_product', 'user': main.User("Tendai Moyo", SENDER).to_dict(),
+        'catalog_version': catalog.version, 'current_category_index': 0, 'current_page_index': 0,
+    }))
+
+    # Free text at choose_product searches instead of failing as a bad number
+    main.message_handler("macaroni", SENDER, PHONE_ID)
+    assert "1. Bella Macaroni 3kg" in sent[-1] and "2. Fattis Macaroni 500g" in sent[-1]
+    assert main.get_user_state(SENDER)['step'] == "choose_search_result"
+
+    main.message_handler("2", SENDER, PHONE_ID)
+    state = main.get_user_state(SENDER)
+    assert state['step'] == "ask_quantity"
+    assert state['selected_product'] == catalog.find_product("Fattis Macaroni 500g").id
+    assert "Fattis Macaroni 500g" in sent[-1]
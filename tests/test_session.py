@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+import session
+
+
+@pytest.fixture
+def short_leases(monkeypatch):
+    # A fresh keeper thread, so renewals follow the short TTL instead of an
+    # earlier test's
+    monkeypatch.setattr(session, "LEASE_TTL_MS", 300)
+    monkeypatch.setattr(session, "_lease_keeper", None)
+
+
+def test_lease_is_exclusive(redis_client, short_leases):
+    with session.sender_lease("263771000001"):
+        with pytest.raises(session.LeaseTimeout):
+            with session.sender_lease("263771000001"):
+                pass
+    assert not redis_client.exists("lease:263771000001")
+
+
+def test_lease_is_renewed_while_held(redis_client, short_leases):
+    with session.sender_lease("263771000001"):
+        token = redis_client.get("lease:263771000001")
+        time.sleep(1)
+        assert redis_client.get("lease:263771000001") == token
+    assert not redis_client.exists("lease:263771000001")
+
+
+def test_waiter_gets_the_lease_once_it_is_released(redis_client, short_leases):
+    order = []
+
+    def second():
+        with session.sender_lease("263771000001"):
+            order.append("second")
+
+    with session.sender_lease("263771000001"):
+        thread = threading.Thread(target=second)
+        thread.start()
+        time.sleep(0.4)
+        order.append("first")
+    thread.join()
+    assert order == ["first", "second"]
+
+
+def test_stale_flush_is_rejected(redis_client):
+    session.update_user_state("263771000001", {"step": "choose_product"})
+    stale = session.Session.load("263771000001")
+    fresh = session.Session.load("263771000001")
+
+    fresh.update({"step": "ask_quantity", "selected_product": "e2d4b8e1"})
+    assert fresh.flush()
+    stale.update({"step": "post_add_menu"})
+    with pytest.raises(session.SessionConflict):
+        stale.flush()
+
+    assert session.get_user_state("263771000001")["step"] == "ask_quantity"
+
+
+def test_stale_first_write_is_rejected(redis_client):
+    first = session.Session.load("263771000001")
+    second = session.Session.load("263771000001")
+    first.update({"step": "save_name"})
+    first.flush()
+    second.update({"step": "choose_product"})
+    with pytest.raises(session.SessionConflict):
+        second.flush()
+
+
+def test_failed_message_leaves_state_untouched(redis_client):
+    session.update_user_state("263771000001", {"step": "choose_product"})
+    with pytest.raises(ValueError):
+        with session.user_session("263771000001"):
+            session.update_user_state("263771000001", {"step": "ask_quantity"})
+            raise ValueError("handler failed")
+    assert session.get_user_state("263771000001")["step"] == "choose_product"
+
+
+def test_update_outside_a_session_merges_into_the_latest_state(redis_client):
+    session.update_user_state("263771000001", {"step": "choose_product", "catalog_version": "abc"})
+    session.update_user_state("263771000001", {"step": "ask_quantity"})
+    state = session.get_user_state("263771000001")
+    assert state["step"] == "ask_quantity"
+    assert state["catalog_version"] == "abc"
+
+
+def test_lease_timeout_masks_the_number(redis_client, short_leases):
+    with session.sender_lease("263771234567"):
+        with pytest.raises(session.LeaseTimeout) as timeout:
+            with session.sender_lease("263771234567"):
+                pass
+    assert "263771234567" not in str(timeout.value)
+    assert "4567" in str(timeout.value)
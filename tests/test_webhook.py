@@ -0,0 +1,109 @@
+import json
+
+import inventory
+import main
+import session
+from test_checkout import checkout_state
+
+
+def payload(*messages):
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"field": "messages", "value": {
+            "metadata": {"phone_number_id": "100000000000001"},
+            "messages": [
+                {"from": sender, "id": message_id, "type": "text", "text": {"body": body}}
+                for sender, message_id, body in messages
+            ],
+        }}]}],
+    }
+
+
+def test_message_that_was_not_handled_is_released_and_the_rest_still_run(redis_client, monkeypatch):
+    handled = []
+
+    def process(sender, prompt, phone_id):
+        if prompt == "boom":
+            raise session.SessionUnavailable("Redis went away")
+        handled.append(prompt)
+
+    monkeypatch.setattr(main, "inbound_mode", "inline")
+    monkeypatch.setattr(main, "process_message", process)
+    client = main.app.test_client()
+
+    response = client.post("/webhook", json=payload(
+        ("263771000001", "wamid.1", "boom"), ("263771000001", "wamid.2", "hi"), ("263771000002", "wamid.3", "hey")
+    ))
+    assert response.status_code == 500
+    assert sorted(handled) == ["hey", "hi"]
+    assert not redis_client.exists("seen_message:wamid.1")
+    assert redis_client.exists("seen_message:wamid.2")
+
+    # WhatsApp's redelivery only runs the message that failed
+    monkeypatch.setattr(main, "process_message", lambda sender, prompt, phone_id: handled.append(prompt))
+    response = client.post("/webhook", json=payload(
+        ("263771000001", "wamid.1", "boom"), ("263771000001", "wamid.2", "hi"), ("263771000002", "wamid.3", "hey")
+    ))
+    assert response.status_code == 200
+    assert sorted(handled) == ["boom", "hey", "hi"]
+
+
+def test_message_that_cannot_be_queued_is_released(redis_client, monkeypatch):
+    queued = []
+
+    def enqueue(sender, prompt, phone_id):
+        if prompt == "boom":
+            raise ConnectionError("Redis went away")
+        queued.append(prompt)
+
+    monkeypatch.setattr(main, "inbound_mode", "queue")
+    monkeypatch.setattr(main, "enqueue_message", enqueue)
+
+    response = main.app.test_client().post("/webhook", json=payload(
+        ("263771000001", "wamid.1", "boom"), ("263771000002", "wamid.2", "hi")
+    ))
+    assert response.status_code == 500
+    assert queued == ["hi"]
+    assert not redis_client.exists("seen_message:wamid.1")
+
+
+def test_failure_after_the_order_is_placed_is_not_redelivered(redis_client, monkeypatch):
+    product = inventory.get_catalog().order_system.get_all_products()[0]
+    inventory.seed_inventory()
+    redis_client.hset(inventory.INVENTORY_KEY, product.name, 5)
+    redis_client.set("user_state:263771000001", json.dumps(checkout_state(product, 2)))
+    sent = []
+    monkeypatch.setattr(main, "inbound_mode", "inline")
+    monkeypatch.setattr(main, "send", lambda answer, sender, phone_id: sent.append(sender))
+    flush = session.Session.flush
+
+    def fail_once(self):
+        monkeypatch.setattr(session.Session, "flush", flush)
+        raise ConnectionError("Redis went away")
+
+    monkeypatch.setattr(session.Session, "flush", fail_once)
+    client = main.app.test_client()
+
+    for _ in range(2):
+        response = client.post("/webhook", json=payload(("263771000001", "wamid.1", "1")))
+        assert response.status_code == 200
+
+    assert redis_client.zcard("orders_by_time") == 1
+    assert int(redis_client.hget(inventory.INVENTORY_KEY, product.name)) == 3
+    assert sent.count("263771000001") == 1
+
+
+def test_unrecognised_reply_is_handled_once(redis_client, monkeypatch):
+    user = main.User("Tendai Moyo", "263771000001")
+    state = {"sender": "263771000001", "step": "post_add_menu", "user": user.to_dict()}
+    redis_client.set("user_state:263771000001", json.dumps(state))
+    monkeypatch.setattr(main, "inbound_mode", "inline")
+    monkeypatch.setattr(main, "send", lambda answer, sender, phone_id: None)
+    client = main.app.test_client()
+
+    for _ in range(2):
+        response = client.post("/webhook", json=payload(("263771000001", "wamid.1", "ok")))
+        assert response.status_code == 200
+
+    assert json.loads(redis_client.get("user_state:263771000001"))["step"] == "post_add_menu"
+    assert redis_client.exists("seen_message:wamid.1")
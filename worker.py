@@ -0,0 +1,93 @@
+"""Drain the inbound message stream and run message_handler.
+
+Run alongside the web app when it is started with INBOUND_MODE=queue:
+
+    python worker.py --threads 8
+"""
+import argparse
+import logging
+import os
+import socket
+import threading
+from db import redis_client
+from logs import mask_phone
+from message_queue import ensure_group, read_messages, ack_messages, peek_inbox, pop_inbox, push_inbox
+from main import handle_message
+from session import LeaseTimeout, sender_lease
+
+running = threading.Event()
+
+
+def drain_inbox(sender):
+    """Handle sender's queued messages oldest first, holding their lease throughout.
+
+    A message leaves the inbox only once it has been handled, so if this
+    worker dies the next one to drain the inbox starts with it.
+    """
+    with sender_lease(sender):
+        while True:
+            message = peek_inbox(sender)
+            if message is None:
+                return
+            prompt, phone_id = message
+            try:
+                handle_message(sender, prompt, phone_id)
+            except Exception as e:
+                logging.error(f"Error processing queued message from {mask_phone(sender)}: {e}", exc_info=True)
+            pop_inbox(sender)
+
+
+def consume(consumer):
+    while running.is_set():
+        try:
+            entries = read_messages(consumer)
+        except Exception as e:
+            logging.error(f"❌ {consumer} failed to read from stream: {e}")
+            running.wait(1)
+            continue
+
+        for entry_id, fields in entries:
+            sender = fields["sender"]
+            try:
+                if "phone_id" in fields:
+                    # Queued before messages waited in per-sender inboxes
+                    pipe = redis_client.pipeline()
+                    push_inbox(pipe, sender, fields.get("prompt"), fields["phone_id"])
+                    pipe.execute()
+                drain_inbox(sender)
+            except LeaseTimeout as e:
+                # The lease holder empties the inbox before it lets go, this message included
+                logging.warning(f"⏳ {e}; leaving {entry_id} to the lease holder")
+            except Exception as e:
+                logging.error(f"Error processing queued message {entry_id}: {e}", exc_info=True)
+                continue
+            ack_messages([entry_id])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process queued WhatsApp messages.")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("WORKER_THREADS", 4)))
+    parser.add_argument("--name", default=f"{socket.gethostname()}-{os.getpid()}")
+    args = parser.parse_args()
+
+    ensure_group()
+    running.set()
+    threads = [
+        threading.Thread(target=consume, args=(f"{args.name}-{i}",), daemon=True)
+        for i in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    logging.info(f"👷 Worker {args.name} started with {args.threads} thread(s)")
+
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        running.clear()
+        for thread in threads:
+            thread.join()
+
+
+if __name__ == "__main__":
+    main()